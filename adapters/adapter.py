@@ -7,9 +7,25 @@ class Adapter(ABC):
         super().__init__()
 
     @abstractmethod
-    def load_option_csv(self, symbol):
+    def load_option_csv(self, symbol, columns=None, float_dtype=None):
         pass
 
     @abstractmethod
     def load_quote_csv(self, symbol):
         pass
+
+    @abstractmethod
+    def iter_option_days(self, symbol, chunksize=200000, columns=None, float_dtype=None):
+        """
+        Stream the option history one DataDate at a time, for use with tyche.stream.StreamingChain.
+        :return: generator of (DataDate, frame for that day)
+        """
+        pass
+
+    @abstractmethod
+    def iter_quote_days(self, symbol, chunksize=200000):
+        """
+        Stream the quote history one quotedate at a time, for use with tyche.stream.StreamingQuote.
+        :return: generator of (quotedate, frame for that day)
+        """
+        pass
@@ -1,5 +1,7 @@
 import os
 from adapters.adapter import Adapter
+from tyche.chain import option_csv_options
+from tyche.stream import iter_csv_days
 import pandas as pd
 
 
@@ -20,15 +22,16 @@ quote_path = '/OneDrive/dev/quote_history/'
 
 class DeltaNeutralAdapater(Adapter):
 
-    def load_option_csv(self, symbol):
+    def load_option_csv(self, symbol, columns=None, float_dtype=None):
         """
 
         :param symbol:
+        :param columns: Columns to load besides the required ones. None loads all of them.
+        :param float_dtype: Precision for the price, IV and greek columns, e.g. 'float32'. None keeps float64.
         :return: pandas dataframe
         """
         fn = os.environ['HOMEPATH'].replace('\\', '/') + option_path + symbol + '.csv'
-        option_date_cols = ['Expiration', 'DataDate']
-        frame = pd.read_csv(fn, parse_dates=option_date_cols)
+        frame = pd.read_csv(fn, **option_csv_options(columns, float_dtype))
         return frame
 
     def load_quote_csv(self, symbol):
@@ -42,3 +45,25 @@ class DeltaNeutralAdapater(Adapter):
         quote_date_cols = ['quotedate']
         frame = pd.read_csv(fn, parse_dates=quote_date_cols)
         return frame
+
+    def iter_option_days(self, symbol, chunksize=200000, columns=None, float_dtype=None):
+        """
+        The option file must already be sorted by DataDate.
+        :param symbol:
+        :param chunksize: Rows read per chunk
+        :param columns: Columns to load besides the required ones. None loads all of them.
+        :param float_dtype: Precision for the price, IV and greek columns, e.g. 'float32'. None keeps float64.
+        :return: generator of (DataDate, frame for that day)
+        """
+        fn = os.environ['HOMEPATH'].replace('\\', '/') + option_path + symbol + '.csv'
+        return iter_csv_days(fn, 'DataDate', chunksize, **option_csv_options(columns, float_dtype))
+
+    def iter_quote_days(self, symbol, chunksize=200000):
+        """
+        The quote file must already be sorted by quotedate.
+        :param symbol:
+        :param chunksize: Rows read per chunk
+        :return: generator of (quotedate, frame for that day)
+        """
+        fn = os.environ['HOMEPATH'].replace('\\', '/') + quote_path + symbol + '.csv'
+        return iter_csv_days(fn, 'quotedate', chunksize, parse_dates=['quotedate'])
@@ -1,12 +1,61 @@
-import datetime as dt
+import argparse
+import ast
+import importlib
 from tyche.backtest import Backtest
-from strategy.buyhold import BuyHold
+from tyche.sweep import sweep_grid, run_sweep
+
+
+def load_class(path):
+    """
+    :param path: dotted path of a class, e.g. strategy.buyhold.BuyHold
+    :return: the class
+    """
+    module, _, name = path.rpartition('.')
+    return getattr(importlib.import_module(module), name)
+
+
+def parse_param(text):
+    """
+    :param text: name=value[,value...]. Values are Python literals where they parse as one, otherwise strings.
+    :return: (name, list of values)
+    """
+    name, _, values = text.partition('=')
+    parsed = []
+    for v in values.split(','):
+        try:
+            parsed.append(ast.literal_eval(v))
+        except (ValueError, SyntaxError):
+            parsed.append(v)
+    return name, parsed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest a strategy, or sweep it over a grid of symbols, "
+                                                 "strategy parameters and starting balances.")
+    parser.add_argument('symbols', nargs='*', default=['TEAM'], help="Underlying symbols")
+    parser.add_argument('--strategy', default='strategy.buyhold.BuyHold', help="Dotted path of the Strategy class")
+    parser.add_argument('--balance', type=float, nargs='+', default=[200000.0], help="Starting balances")
+    parser.add_argument('--param', action='append', default=[], type=parse_param, metavar='NAME=V1,V2',
+                        help="Strategy keyword argument and the values to sweep. May be repeated.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for a sweep (default: number of CPUs)")
+    parser.add_argument('--shared', action='store_true',
+                        help="Load each symbol once and share it with the sweep workers through shared memory")
+    return parser.parse_args(argv)
+
 
 if __name__ == '__main__':
 
-    # Get options from args
-    # Create broker
-    # Create strategy
-    # Create a backtest per symbol for the given dates
-    bt = Backtest('TEAM', BuyHold, 200000)
-    bt.run()
+    args = parse_args()
+    runs = sweep_grid(args.symbols, load_class(args.strategy), args.balance, dict(args.param))
+    if len(runs) == 1:
+        # A single backtest runs in this process and reports every day.
+        run = runs[0]
+        bt = Backtest(run.symbol, run.strategy_cls, run.starting_balance, strategy_args=run.strategy_args)
+        bt.run()
+    else:
+        failed = 0
+        for result in run_sweep(runs, args.workers, args.shared):
+            print(result, flush=True)
+            failed += not result.ok()
+        print("{} runs, {} failed".format(len(runs), failed))
@@ -1,5 +1,6 @@
 import datetime as dt
 import random
+import numpy as np
 from strategy.strategy import Strategy
 from tyche.position import Position
 from tyche.broker import Broker
@@ -9,10 +10,10 @@ class BuyHold(Strategy):
 
     def __init__(self):
         super(BuyHold, self).__init__()
-        self._symbol = None
+        self._symbols = []
 
     def prepare(self, symbol):
-        self._symbol = symbol
+        self._symbols = [symbol] if isinstance(symbol, str) else list(symbol)
 
     def update(self, current_date: dt.datetime, broker):
         """
@@ -27,10 +28,26 @@ class BuyHold(Strategy):
         :param broker:
         :return:
         """
-        positions = broker.positions()
-        if not positions:
-            cash = broker.stock_buying_power()
-            price = broker.stock_quote().get_current_price()
-            cnt = int(cash/price)
-            p = Position(cnt, self._symbol, 'S', 0.0)
-            broker.place_order([p])
+        # Split the cash evenly across the symbols not bought yet. One without a quote today is bought later.
+        held = {p.underlying for p in broker.positions()}
+        missing = [symbol for symbol in self._symbols if symbol not in held]
+        if missing:
+            cash = broker.stock_buying_power() / len(missing)
+            for symbol in missing:
+                quote = broker.stock_quote(symbol)
+                if quote is None:
+                    continue
+                price = quote.get_current_price()
+                cnt = int(cash/price)
+                p = Position(cnt, symbol, 'S', 0.0)
+                broker.place_order([p])
+
+    def target_positions(self, dates, bars, starting_balance):
+        """
+        Buy as many shares as the starting balance allows on the first day and hold them.
+        Only a single symbol runs vectorized.
+        """
+        if len(self._symbols) > 1:
+            return None
+        cnt = int(starting_balance / bars['close'][0])
+        return np.full(len(dates), cnt, dtype=np.int64)
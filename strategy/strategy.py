@@ -7,6 +7,12 @@ from tyche.broker import Broker
 class Strategy(ABC):
 
     def prepare(self, symbol):
+        """
+        Called at the start of every run.
+        :param symbol: the symbol given to the Backtest: one underlying, or a list of them for a portfolio strategy
+                       (the first one drives the dates; reach the others through broker.stock_quote(symbol) and
+                       broker.option_chain(symbol))
+        """
         pass
 
     @abstractmethod
@@ -27,6 +33,18 @@ class Strategy(ABC):
         """
         pass
 
+    def target_positions(self, dates, bars, starting_balance):
+        """
+        Optional whole-history form of update() for strategies that only trade the underlying on signals from its
+        quotes. Used by Backtest(vectorized=True) to skip the daily event loop.
+        :param dates: trading dates of the backtest
+        :param bars: dict of open, high, low, close, volume -> array aligned with dates
+        :param starting_balance: Initial cash balance
+        :return: array of shares to hold at the end of each date (filled at that day's close), or None if this
+                 strategy can only run day by day
+        """
+        return None
+
     def assignment(self, cnt_assigned_positions, symbol, current_date: dt.datetime, broker: Broker):
         """
         Default implementation is to close the assigned position at market price.
@@ -126,3 +126,25 @@ def test_broker_set_current_date(symbol):
         assert broker.stock_buying_power() == 100000.0 + profit_loss + total_profit_loss
 
         total_profit_loss += profit_loss
+
+
+def test_broker_reset():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path)
+    quote = Quote(symbol, quote_path)
+    broker = Broker(100000.0, chain, quote)
+
+    min_date, max_date = chain.date_range()
+    broker.open_current_date(min_date)
+    price = quote.get_current_price()
+    status_code, status_message = broker.place_order([Position(100, symbol, 'S', 0.0)])
+    assert status_code == 0
+    assert broker.positions()
+    assert broker.stock_buying_power() == 100000.0 - 100 * price
+
+    broker.reset(50000.0)
+    assert not broker.positions()
+    assert broker.stock_buying_power() == 50000.0
+    assert broker.net_liquid() == 50000.0
+    # Same chain and quote, any date again.
+    assert broker.open_current_date(min_date) == min_date
@@ -0,0 +1,59 @@
+import os
+import glob
+import pandas as pd
+from tyche.cache import load_frame, cache_dir, column_tag
+
+
+def test_load_frame_cache(tmp_path):
+    fn = str(tmp_path / 'XYZ.csv')
+    pd.DataFrame({'a': [1, 2, 3]}).to_csv(fn, index=False)
+    calls = []
+
+    def prepare():
+        calls.append(fn)
+        return pd.read_csv(fn)
+
+    frame = load_frame(fn, prepare)
+    assert len(calls) == 1
+    cached = load_frame(fn, prepare)
+    assert len(calls) == 1
+    assert cached.equals(frame)
+
+    # A different tag gets its own cache, and the two do not evict each other.
+    load_frame(fn, prepare, tag='ExpirationType')
+    assert len(calls) == 2
+    load_frame(fn, prepare)
+    load_frame(fn, prepare, tag='ExpirationType')
+    assert len(calls) == 2
+    assert len(glob.glob(os.path.join(str(tmp_path), cache_dir, '*.pkl'))) == 2
+
+    # A changed file invalidates the cache and replaces the old copy of the same tag.
+    pd.DataFrame({'a': [1, 2, 3, 4]}).to_csv(fn, index=False)
+    frame = load_frame(fn, prepare, tag='ExpirationType')
+    assert len(calls) == 3
+    assert len(frame) == 4
+    assert len(glob.glob(os.path.join(str(tmp_path), cache_dir, '*.pkl'))) == 2
+    load_frame(fn, prepare)
+    assert len(calls) == 4
+    assert len(glob.glob(os.path.join(str(tmp_path), cache_dir, '*.pkl'))) == 2
+
+    load_frame(fn, prepare, use_cache=False)
+    assert len(calls) == 5
+
+    # save=False reads a valid cache but never writes one.
+    other = str(tmp_path / 'ABC.csv')
+    pd.DataFrame({'a': [1]}).to_csv(other, index=False)
+    load_frame(other, lambda: pd.read_csv(other), save=False)
+    assert not glob.glob(os.path.join(str(tmp_path), cache_dir, 'ABC.csv.*.pkl'))
+
+
+def test_column_tag_follows_code():
+    def first(frame):
+        return frame['a'] * 2
+
+    def second(frame):
+        return frame['a'] * 3
+
+    second.__qualname__ = first.__qualname__
+    assert column_tag({'b': first}) == column_tag({'b': first})
+    assert column_tag({'b': first}) != column_tag({'b': second})
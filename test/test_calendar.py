@@ -0,0 +1,26 @@
+import datetime as dt
+from tyche.chain import Chain
+from tyche.quote import Quote
+from tyche.calendar import TradingCalendar
+
+
+option_path = '../../option_history/'
+quote_path = '../../quote_history/'
+
+
+def test_trading_calendar():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path)
+    quote = Quote(symbol, quote_path)
+    calendar = TradingCalendar(chain, quote)
+    assert len(calendar) > 0
+    assert all(d.weekday() < 5 for d in calendar)
+    assert set(calendar.dates) <= set(chain.trading_dates()) & set(quote.trading_dates())
+
+    # Saturday 2018-06-09 rolls to Monday 2018-06-11
+    saturday = dt.datetime(2018, 6, 9)
+    assert saturday not in calendar
+    assert calendar.next_on_or_after(saturday) == dt.datetime(2018, 6, 11)
+    assert calendar.next_on_or_after(calendar.dates[-1] + dt.timedelta(days=1)) is None
+    week = calendar.between(dt.datetime(2018, 6, 9), dt.datetime(2018, 6, 15))
+    assert [d.day for d in week] == [11, 12, 13, 14, 15]
@@ -1,7 +1,9 @@
 import datetime as dt
 import pytest
+import pandas as pd
 from util import opra_code
-from tyche.chain import Chain
+from tyche.chain import Chain, expiration_type_from_row, expiration_type_from_frame
+from tyche import chainfilter
 
 
 option_path = '../../option_history/'
@@ -69,3 +71,154 @@ def test_load_chain(symbol):
     start, end = chain.date_range()
     assert start < end
     chain.set_current_date(start)
+
+
+@pytest.mark.parametrize("symbol", symbols)
+def test_current_date_slice(symbol):
+    chain = Chain(symbol, option_path)
+    start, end = chain.date_range()
+    chain.set_current_date(start)
+    assert (chain.current['DataDate'] == start).all()
+    assert len(chain.current) == (chain.frame['DataDate'] == start).sum()
+    assert chain.current.index.name == 'ContractKey'
+
+
+def test_expiration_type_vectorized():
+    frame = pd.DataFrame({'Expiration': pd.to_datetime(['2018-06-08', '2018-06-15', '2018-06-22', '2019-04-18',
+                                                        '2019-03-15', '2018-12-21', '2018-12-14'])})
+    expected = [expiration_type_from_row(row) for _, row in frame.iterrows()]
+    assert list(expiration_type_from_frame(frame)) == expected
+    assert expected == ['Weekly', 'Monthly', 'Weekly', 'Weekly', 'Monthly', 'Monthly', 'Weekly']
+
+
+def test_memory_mapped_chain():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path)
+    mapped = Chain(symbol, option_path, memory_map=True)
+    assert mapped.frame is None
+    assert mapped.date_range() == chain.date_range()
+
+    current_date = dt.datetime(year=2018, month=6, day=7)
+    chain.set_current_date(current_date)
+    mapped.set_current_date(current_date)
+    assert len(mapped.current) == len(chain.current)
+
+    oc = opra_code(symbol, dt.datetime(year=2018, month=6, day=8), 56, 'Call')
+    x = mapped.get_by_opra(oc)
+    y = chain.get_by_opra(oc)
+    for col in ['UnderlyingSymbol', 'Strike', 'Expiration', 'DataDate', 'Bid', 'Ask', 'ExpirationType']:
+        assert x[col] == y[col]
+    assert mapped.find_expiration(current_date, 1) == chain.find_expiration(current_date, 1)
+    # Categoricals come back as categoricals, not strings.
+    for col in ['OptionSymbol', 'Type', 'ExpirationType']:
+        assert isinstance(mapped.current[col].dtype, pd.CategoricalDtype)
+        assert list(mapped.current[col].astype(str)) == list(chain.current[col].astype(str))
+
+
+def test_compact_chain():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path, columns=['Delta'], float_dtype='float32')
+    assert 'Delta' in chain.frame.columns
+    assert 'Gamma' not in chain.frame.columns
+    assert chain.frame['Bid'].dtype == 'float32'
+    assert isinstance(chain.frame['Type'].dtype, pd.CategoricalDtype)
+
+    current_date = dt.datetime(year=2018, month=6, day=7)
+    chain.set_current_date(current_date)
+    oc = opra_code(symbol, dt.datetime(year=2018, month=6, day=8), 56, 'Call')
+    x = chain.get_by_opra(oc)
+    assert x['Strike'] == 56
+    assert x['DataDate'] == current_date
+
+
+def test_get_current_prices():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path)
+    chain.set_current_date(dt.datetime(year=2018, month=6, day=7))
+    keys = chain.current.index[:10].to_numpy()
+    sizes = [1, -1] * 5
+    prices = chain.get_current_prices(keys, sizes)
+    assert list(prices) == [chain.get_current_price(k, n) for k, n in zip(keys, sizes)]
+    with pytest.raises(KeyError):
+        chain.get_current_prices([0], [1])
+
+
+def test_filter():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path)
+    chain.set_current_date(dt.datetime(year=2018, month=6, day=7))
+    frame = chain.current
+
+    spec = {'Type': 'put', 'Expiration': (dt.datetime(2018, 6, 8), dt.datetime(2018, 7, 1)), 'Strike': (40, 50),
+            'Delta': (-0.6, -0.1)}
+    expected = frame[(frame['Type'] == 'put') & (frame['Expiration'] >= '2018-06-08') &
+                     (frame['Expiration'] < '2018-07-01') & (frame['Strike'] >= 40) & (frame['Strike'] < 50) &
+                     (frame['Delta'] >= -0.6) & (frame['Delta'] < -0.1)]
+    result = chain.filter(spec)
+    assert len(result) and sorted(result.index) == sorted(expected.index)
+
+    # Strike:(10,) means Strike >= 10
+    calls = chain.filter({'Type': 'C', 'Strike': (50,)})
+    assert sorted(calls.index) == sorted(frame[(frame['Type'] == 'call') & (frame['Strike'] >= 50)].index)
+    assert chain.filter({'Strike': (1e9,)}).empty
+
+    # One expiration and type is a contiguous run of the presorted day, so the result is a slice.
+    positions = chain.filter_positions({'Type': 'call', 'Expiration': (dt.datetime(2018, 6, 8),
+                                                                      dt.datetime(2018, 6, 9))})
+    assert isinstance(positions, slice)
+
+    # The presorted day is used as is; a shuffled one is sorted and gives the same rows.
+    assert chain.day_index().order is None
+    shuffled = frame.sample(frac=1, random_state=0)
+    index = chainfilter.ChainDayIndex(shuffled)
+    assert index.order is not None
+    matched = shuffled.iloc[chainfilter.compile_filter(spec).positions(index, shuffled)]
+    assert sorted(matched.index) == sorted(expected.index)
+
+    # Specs that change daily do not pile up in the compiled cache.
+    for strike in range(2 * chainfilter.compiled_filters):
+        chain.filter({'Strike': (strike,)})
+    assert len(chainfilter._compiled) == chainfilter.compiled_filters
+    assert chainfilter.compile_filter(spec) is chainfilter.compile_filter(spec)
+
+
+def test_find_expiration_matches_scan():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path)
+    for current_date in chain.trading_dates()[::7]:
+        chain.set_current_date(current_date)
+        expirs = sorted(set(chain.current['Expiration']))
+        for days in [0, 1, 5, 30, -1, -5]:
+            ref = current_date + dt.timedelta(days=days)
+            for weekly in [True, False]:
+                ok = [e for e in expirs if weekly or expiration_type_from_row({'Expiration': e}) == 'Monthly']
+                if days >= 0:
+                    if ref > expirs[-1]:
+                        continue
+                    expected = next((e for e in ok if e >= ref), None)
+                else:
+                    if ref < expirs[0]:
+                        continue
+                    expected = next((e for e in reversed(ok) if e <= ref), None)
+                assert chain.find_expiration(current_date, days, weekly) == expected
+
+
+def test_strike_and_delta_ladders():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path)
+    chain.set_current_date(dt.datetime(year=2018, month=6, day=7))
+    expiration = dt.datetime(year=2018, month=6, day=15)
+    frame = chain.current
+    puts = frame[(frame['Type'] == 'put') & (frame['Expiration'] == expiration)]
+    price = float(puts['UnderlyingPrice'].iloc[0])
+
+    by_strike = puts.sort_values('Strike')
+    atm = int(by_strike.index[(by_strike['Strike'] - price).abs().to_numpy().argmin()])
+    assert chain.nearest_strike(expiration, 'put', price) == atm
+    assert chain.get_by_key(atm)['Strike'] == min(puts['Strike'], key=lambda k: (abs(k - price), k))
+    assert chain.get_by_key(chain.strikes_away(expiration, 'P', price, 1))['Strike'] > chain.get_by_key(atm)['Strike']
+    assert chain.strikes_away(expiration, 'put', price, len(puts)) is None
+
+    key = chain.nearest_delta(expiration, 'put', -0.30)
+    assert abs(chain.get_by_key(key)['Delta'] + 0.30) == (puts['Delta'] + 0.30).abs().min()
+    assert chain.nearest_strike(dt.datetime(year=2030, month=1, day=1), 'put', price) is None
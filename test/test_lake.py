@@ -0,0 +1,55 @@
+import datetime as dt
+import pandas as pd
+import pytest
+from util import opra_code
+from tyche.chain import Chain
+from tyche.quote import Quote
+from tyche.lake import build_lake, load_chain, load_quote, LakeStore, chains_kind
+
+
+option_path = '../../option_history/'
+quote_path = '../../quote_history/'
+current_date = dt.datetime(year=2018, month=6, day=7)
+
+
+def test_lake_loads_only_the_range(tmp_path):
+    chain = Chain('MS', option_path)
+    quote = Quote('MS', quote_path)
+    build_lake(chain, quote, str(tmp_path))
+
+    # The whole lake reads back as the original history.
+    whole = load_chain('MS', str(tmp_path))
+    assert whole.date_range() == chain.date_range()
+    assert whole.trading_dates().equals(chain.trading_dates())
+
+    # A range inside one month opens one partition and covers only its days.
+    start, end = dt.datetime(year=2018, month=6, day=4), dt.datetime(year=2018, month=6, day=15)
+    store = LakeStore(str(tmp_path), 'MS', chains_kind, start, end)
+    assert len(store._parts) == 1
+    assert store.dates[0] >= pd.Timestamp(start) and store.dates[-1] <= pd.Timestamp(end)
+
+    part = load_chain('MS', str(tmp_path), start, end)
+    part_quote = load_quote('MS', str(tmp_path), start, end)
+    lo, hi = part.date_range()
+    assert lo >= start and hi <= end
+
+    for c, q in ((chain, quote), (part, part_quote)):
+        c.set_current_date(current_date)
+        q.set_current_date(current_date)
+    opra = opra_code('MS', dt.datetime(year=2018, month=6, day=8), 56, 'Call')
+    assert float(part.get_by_opra(opra)['Bid']) == float(chain.get_by_opra(opra)['Bid'])
+    assert float(part_quote.get_current_price()) == float(quote.get_current_price())
+    assert part.find_expiration(current_date, 7) == chain.find_expiration(current_date, 7)
+
+    # Ranges spanning months splice the partitions together.
+    start, end = dt.datetime(year=2018, month=6, day=25), dt.datetime(year=2018, month=7, day=6)
+    spanning = LakeStore(str(tmp_path), 'MS', chains_kind, start, end)
+    assert len(spanning._parts) == 2
+    frame = spanning.frame(0, spanning.offsets[-1])
+    assert len(frame) == spanning.offsets[-1]
+    assert frame['DataDate'].is_monotonic_increasing
+    assert len(spanning.column('Bid')) == len(frame)
+
+    with pytest.raises(FileNotFoundError):
+        LakeStore(str(tmp_path), 'MS', chains_kind, dt.datetime(year=1990, month=1, day=1),
+                  dt.datetime(year=1990, month=2, day=1))
@@ -0,0 +1,128 @@
+import datetime as dt
+import pandas as pd
+import pytest
+from tyche.position import Position
+from tyche.chain import Chain, InvalidChainDate
+from tyche.quote import Quote
+from tyche.broker import Broker
+from tyche.backtest import Backtest
+from tyche.market import MarketData
+from strategy.buyhold import BuyHold
+
+
+option_path = '../../option_history/'
+quote_path = '../../quote_history/'
+first_date = dt.datetime(year=2018, month=6, day=7)
+next_date = dt.datetime(year=2018, month=6, day=8)
+saturday = dt.datetime(year=2018, month=6, day=9)
+
+
+def _no_chain(symbol):
+    raise AssertionError("{} chain loaded".format(symbol))
+
+
+def test_market_loads_lazily_within_budget():
+    market = MarketData(option_path=option_path, quote_path=quote_path)
+    market.set_current_date(first_date)
+    assert market.symbols() == []
+    assert market.chain('MS').cur_date == first_date
+    assert market.symbols() == ['MS']
+    assert market.memory_usage() > 0
+
+    # Quotes and chains load separately.
+    market = MarketData(option_path=option_path, quote_path=quote_path, chain_loader=_no_chain)
+    market.set_current_date(first_date)
+    assert market.quote('TLT').cur_date == first_date
+
+    # Room for only one symbol: touching another drops the least recently used.
+    market = MarketData(1, option_path=option_path, quote_path=quote_path)
+    market.set_current_date(first_date)
+    market.quote('MS')
+    market.quote('TLT')
+    assert market.symbols() == ['TLT']
+    market.set_current_date(next_date)
+    assert market.quote('MS').cur_date == next_date
+    assert market.symbols() == ['MS']
+
+    # Pinned histories stay.
+    market = MarketData(1, option_path=option_path, quote_path=quote_path)
+    market.add('MS', Chain('MS', option_path), Quote('MS', quote_path))
+    market.set_current_date(first_date)
+    market.quote('TLT')
+    market.quote('TEAM')
+    assert market.symbols() == ['MS', 'TEAM']
+
+
+def test_market_without_chain_rows():
+    market = MarketData(option_path=option_path, quote_path=quote_path)
+    market.set_current_date(saturday)
+    assert market.chain('TLT') is None
+    with pytest.raises(InvalidChainDate):
+        market.chain('TLT', required=True)
+    market.set_current_date(next_date)
+    assert market.chain('TLT', required=True).cur_date == next_date
+
+
+def test_broker_routes_by_underlying():
+    chain = Chain('MS', option_path)
+    quote = Quote('MS', quote_path)
+    # Trading TLT stock never needs its chain.
+    market = MarketData(option_path=option_path, quote_path=quote_path, chain_loader=_no_chain)
+    broker = Broker(100000.0, chain, quote, market=market)
+    broker.open_current_date(first_date)
+    assert market.symbols() == ['MS']
+
+    tlt_price = broker.stock_quote('TLT').get_current_price()
+    ms_price = broker.stock_quote().get_current_price()
+    assert tlt_price != ms_price
+    status_code, status_message = broker.place_order([Position(100, 'TLT', 'S', 0.0), Position(100, 'MS', 'S', 0.0)])
+    assert status_code == 0
+    assert broker.stock_buying_power() == 100000.0 - 100 * tlt_price - 100 * ms_price
+
+    # Each position is marked from its own underlying's quote.
+    broker.open_current_date(next_date)
+    expected = broker.stock_buying_power() + 100 * market.quote('TLT').get_current_price() + \
+        100 * market.quote('MS').get_current_price()
+    assert abs(broker.net_liquid() - expected) < 1e-6
+
+
+def test_multi_symbol_backtest():
+    chain = Chain('MS', option_path)
+    quote = Quote('MS', quote_path)
+    market = MarketData(option_path=option_path, quote_path=quote_path)
+    backtest = Backtest(['MS', 'TLT'], BuyHold, 100000.0, verbose=False, chain=chain, quote=quote, market=market,
+                        vectorized=True)
+    net_liquid = backtest.run()
+    assert backtest.result is None
+    held = {p.underlying: p.quantity for p in backtest._broker.positions()}
+    assert set(held) == {'MS', 'TLT'}
+    assert net_liquid == pytest.approx(backtest._broker.stock_buying_power() +
+                                       held['MS'] * market.quote('MS').get_current_price() +
+                                       held['TLT'] * market.quote('TLT').get_current_price())
+
+
+def test_missing_secondary_quote(tmp_path):
+    # TLT misses a day MS trades: the backtest keeps going and TLT keeps its last mark that day.
+    gap_date = next_date
+    frame = pd.read_csv(quote_path + 'TLT.csv', index_col=0)
+    frame[frame['quotedate'] != gap_date.strftime('%Y-%m-%d')].to_csv(str(tmp_path / 'TLT.csv'))
+
+    def quote_loader(symbol):
+        return Quote(symbol, str(tmp_path) + '/', use_cache=False) if symbol == 'TLT' else Quote(symbol, quote_path)
+
+    market = MarketData(quote_loader=quote_loader, chain_loader=_no_chain)
+    broker = Broker(100000.0, Chain('MS', option_path), Quote('MS', quote_path), market=market)
+    broker.open_current_date(first_date)
+    assert broker.place_order([Position(100, 'TLT', 'S', 0.0)])[0] == 0
+    tlt_price = broker.stock_quote('TLT').get_current_price()
+
+    assert broker.open_current_date(gap_date) == gap_date
+    assert broker.stock_quote('TLT') is None
+    assert broker.place_order([Position(100, 'TLT', 'S', 0.0)])[0] == -4
+    assert broker.net_liquid() == pytest.approx(broker.stock_buying_power() + 100 * tlt_price)
+
+    market = MarketData(quote_loader=quote_loader, chain_loader=_no_chain)
+    backtest = Backtest(['MS', 'TLT'], BuyHold, 100000.0, verbose=False, chain=Chain('MS', option_path),
+                        quote=Quote('MS', quote_path), market=market, vectorized=True)
+    backtest.run()
+    assert {p.underlying for p in backtest._broker.positions()} == {'MS', 'TLT'}
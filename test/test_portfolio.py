@@ -209,3 +209,61 @@ def test_update_prices(symbol):
         open_pl, closed_pl = port.update_prices(chain, quote)
         assert 0.0 == approx(open_pl)
         assert closed_pl == approx(total_closed_orders)
+
+
+def test_expire_closed_and_reopened_positions():
+    port = Portfolio()
+    expiration = dt.datetime(2018, 6, 15)
+    port.add_order(1, 'MS', expiration, 'C', 50.0, expiration - dt.timedelta(days=7), 1.0)
+    port.add_order(-1, 'MS', expiration, 'C', 50.0, expiration - dt.timedelta(days=6), 1.0)
+    port.add_order(2, 'MS', expiration, 'P', 45.0, expiration - dt.timedelta(days=5), 1.0)
+    port.add_order(3, 'MS', expiration + dt.timedelta(days=7), 'P', 45.0, expiration - dt.timedelta(days=5), 1.0)
+
+    expiry = port.expire_positions(expiration)
+    assert [(p.quantity, p.strike) for p in expiry] == [(2, 45.0)]
+    assert all(p.close_date == expiration for p in expiry)
+    assert len(port.gen_statement()) == 1
+    assert not port.expire_positions(expiration)
+    assert len(port.expire_positions(expiration + dt.timedelta(days=30))) == 1
+
+
+@pytest.mark.parametrize("symbol", symbols)
+def test_realized_pl_debug(symbol):
+    chain = Chain(symbol, option_path)
+    quote = Quote(symbol, quote_path)
+    max_chain_date = chain.date_range()[1]
+    port = Portfolio(debug=True)
+
+    opra_codes = [x for x, y in valid_opra[symbol]]
+    for oc in opra_codes:
+        symbol, expiration, strike, option_type = decompose_opra(oc)
+        if expiration > max_chain_date:
+            break
+        entry_date = expiration - dt.timedelta(days=7)
+        port.add_order(2, symbol, expiration, option_type, strike, entry_date, 1.0)
+        port.add_order(-1, symbol, expiration, option_type, strike, entry_date, 1.5)
+
+        chain.set_current_date(expiration)
+        quote.set_current_date(expiration)
+        open_pl, closed_pl, liquid = port.update_prices(chain, quote)
+        port.expire_positions(expiration)
+        # The running total must match the full recompute done in debug mode.
+        open_pl, closed_pl, liquid = port.update_prices(chain, quote)
+        assert 0.0 == approx(open_pl)
+        assert closed_pl == approx(port._recompute_closed_pl())
+
+
+def test_lots_close_first_in_first_out():
+    port = Portfolio()
+    expiration = dt.datetime(2018, 6, 15)
+    opened = expiration - dt.timedelta(days=10)
+    port.add_order(2, 'MS', expiration, 'C', 50.0, opened, 1.0)
+    port.add_order(3, 'MS', expiration, 'C', 50.0, opened + dt.timedelta(days=1), 2.0)
+    port.add_order(-4, 'MS', expiration, 'C', 50.0, opened + dt.timedelta(days=2), 2.5)
+
+    # The 2 lot @ $1 closes whole, then 2 of the 3 @ $2, leaving 1 open @ $2.
+    statement = port.gen_statement()
+    assert [(p.quantity, p.entry_price) for p in statement] == [(1, 2.0)]
+    closed = [port.Order(port._book, row) for rows in port._closed_orders.values() for row in rows]
+    assert [(p.quantity, p.entry_price) for p in closed] == [(2, 1.0), (-2, 2.5)]
+    assert len(port._book) == 3
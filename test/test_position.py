@@ -1,6 +1,10 @@
 import datetime as dt
+import numpy as np
+import pandas as pd
+import pytest
 from pytest import approx
-from util import decompose_opra
+from util import decompose_opra, opra_code_from_key, contract_key_from_opra, decompose_opra_codes, opra_codes, \
+    contract_keys_from_frame, root_underlying
 from tyche.position import Position
 
 
@@ -133,3 +137,50 @@ def test_opra_codes():
         symbol, expiration, strike, option_type = decompose_opra(oc)
         p = Position(100, symbol, option_type, strike, expiration)
         assert oc == p.opra_code()
+
+
+def test_contract_keys():
+    exp = dt.datetime(2018, 6, 15)
+    call = Position(10, 'XYZ', 'C', 99.0, exp)
+    put = Position(10, 'XYZ', 'P', 99.0, exp)
+    stock = Position(100, 'XYZ', 'S')
+    others = [Position(1, 'XY', 'C', 99.0, exp), Position(1, 'XYZ', 'C', 99.5, exp),
+              Position(1, 'XYZ', 'C', 99.0, dt.datetime(2018, 6, 22))]
+    keys = {p.contract_key() for p in [call, put, stock] + others}
+    assert len(keys) == 6
+    for p in (call, put, stock):
+        assert opra_code_from_key(p.contract_key()) == p.opra_code()
+        assert contract_key_from_opra(p.opra_code()) == p.contract_key()
+    assert Position(-5, 'XYZ', 'call', 99.0, exp).contract_key() == call.contract_key()
+
+    # Strikes that are not exact in binary round the same way in the key and the OPRA code.
+    odd = Position(1, 'XYZ', 'C', 1.005, exp)
+    assert odd.opra_code() == 'XYZ180615C00001005'
+    assert contract_key_from_opra(odd.opra_code()) == odd.contract_key()
+    with pytest.raises(ValueError):
+        Position(1, 'XYZ', 'C', 99.0, dt.datetime(1999, 12, 31)).contract_key()
+
+
+def test_vectorized_opra_codes():
+    ocs = ['TEAM180615C00055000', 'TLT180928P00121500', 'MS190418P00045000', 'TEAM180615C00055000',
+           'MS210115P00070000']
+    symbols, expirations, strikes, opt_types = decompose_opra_codes(ocs)
+    for i, oc in enumerate(ocs):
+        symbol, expiration, strike, option_type = decompose_opra(oc)
+        assert symbols[i] == symbol
+        assert expirations[i] == np.datetime64(expiration)
+        assert strikes[i] == strike
+        assert opt_types[i] == option_type
+    assert list(opra_codes(symbols, expirations, strikes, ['call', 'put', 'put', 'call', 'put'])) == ocs
+
+
+def test_contract_keys_keep_roots_apart():
+    exp = dt.datetime(2019, 6, 21)
+    frame = pd.DataFrame({'OptionSymbol': ['SPX190621C02900000', 'SPXW190621C02900000'],
+                          'UnderlyingSymbol': ['SPX', 'SPX'], 'Expiration': [exp, exp], 'Type': ['call', 'call'],
+                          'Strike': [2900.0, 2900.0]})
+    keys = contract_keys_from_frame(frame)
+    assert keys[0] != keys[1]
+    assert list(keys) == [contract_key_from_opra(oc) for oc in frame['OptionSymbol']]
+    assert root_underlying('SPXW') == 'SPX'
+    assert root_underlying('SPX') == 'SPX'
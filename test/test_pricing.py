@@ -0,0 +1,73 @@
+import datetime as dt
+import numpy as np
+import pandas as pd
+from pytest import approx
+from util import _prob_itm
+from tyche.pricing import price, greeks, prob_itm, implied_vol, chain_greeks
+
+
+def test_put_call_parity():
+    s, k, t, sigma, r, q = 100.0, np.array([80.0, 100.0, 120.0]), 0.5, 0.25, 0.03, 0.01
+    call = price(s, k, t, sigma, True, r, q)
+    put = price(s, k, t, sigma, False, r, q)
+    assert call - put == approx(s * np.exp(-q * t) - k * np.exp(-r * t))
+    assert price(s, k, 0.0, sigma, True) == approx([20.0, 0.0, 0.0])
+
+
+def test_greeks_match_finite_differences():
+    s, k, t, sigma, r = 100.0, 105.0, 0.3, 0.2, 0.02
+    for is_call in [True, False]:
+        g = greeks(s, k, t, sigma, is_call, r)
+        h = 1e-4
+        assert g['delta'] == approx((price(s + h, k, t, sigma, is_call, r) -
+                                     price(s - h, k, t, sigma, is_call, r)) / (2 * h), rel=1e-5)
+        assert g['gamma'] == approx((price(s + h, k, t, sigma, is_call, r) - 2 * price(s, k, t, sigma, is_call, r) +
+                                     price(s - h, k, t, sigma, is_call, r)) / h ** 2, rel=1e-3)
+        assert g['vega'] == approx((price(s, k, t, sigma + h, is_call, r) -
+                                    price(s, k, t, sigma - h, is_call, r)) / (2 * h), rel=1e-5)
+        assert g['theta'] == approx(-(price(s, k, t + h, sigma, is_call, r) -
+                                      price(s, k, t - h, sigma, is_call, r)) / (2 * h), rel=1e-5)
+
+
+def test_implied_vol_round_trip():
+    rng = np.random.default_rng(7)
+    n = 200000
+    s = rng.uniform(20, 200, n)
+    k = s * rng.uniform(0.5, 1.5, n)
+    t = rng.uniform(1 / 365, 2, n)
+    sigma = rng.uniform(0.05, 1.5, n)
+    is_call = rng.random(n) < 0.5
+    value = price(s, k, t, sigma, is_call, 0.01)
+    iv = implied_vol(value, s, k, t, is_call, 0.01)
+    # Options worth (nearly) nothing beyond intrinsic carry no volatility information.
+    informative = greeks(s, k, t, sigma, is_call, 0.01)['vega'] > 1e-3
+    assert np.abs(iv - sigma)[informative].max() < 1e-5
+    assert np.isnan(implied_vol(0.5, 100.0, 50.0, 0.5, True))  # below intrinsic
+
+
+def test_prob_itm_matches_row_version():
+    frame = pd.DataFrame({
+        'UnderlyingPrice': [66.67, 80.7, 104.12, 117.17, 50.0, 50.0],
+        'Strike': [55.0, 95.0, 105.0, 150.0, 45.0, 50.0],
+        'Type': ['call', 'call', 'put', 'call', 'put', 'put'],
+        'Expiration': pd.to_datetime(['2018-06-15', '2019-03-15', '2019-06-21', '2019-12-20', '2019-01-18',
+                                      '2018-01-05']),
+        'DataDate': pd.to_datetime(['2018-06-05', '2018-11-28', '2019-02-20', '2019-05-08', '2018-12-03',
+                                    '2018-01-05']),
+        'ProbITM': [0.5, 0.46, 0.39, 0.4, 0.3, 0.3]})
+    expected = [_prob_itm(row) for _, row in frame.iterrows()]
+    t = (frame['Expiration'] - frame['DataDate']).dt.days.to_numpy() / 365.0
+    result = prob_itm(frame['UnderlyingPrice'], frame['Strike'], t, frame['ProbITM'], frame['Type'] == 'call')
+    assert list(result) == approx(expected)
+
+
+def test_chain_greeks():
+    expiration = dt.datetime(2019, 1, 18)
+    value = price(50.0, [45.0, 55.0], 45 / 365, 0.3, [False, True])
+    frame = pd.DataFrame({'UnderlyingPrice': 50.0, 'Strike': [45.0, 55.0], 'Type': ['put', 'call'],
+                          'Expiration': expiration, 'DataDate': expiration - dt.timedelta(days=45),
+                          'Bid': value - 0.01, 'Ask': value + 0.01}, index=[10, 20])
+    result = chain_greeks(frame)
+    assert list(result.index) == [10, 20]
+    assert list(result['IV']) == approx([0.3, 0.3], abs=1e-6)
+    assert result['Delta'].iloc[0] < 0 < result['Delta'].iloc[1]
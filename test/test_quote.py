@@ -50,3 +50,15 @@ def test_get_by_opra(symbol):
         assert x['quotedate'] == current_date
         assert x['close'] == float(cols[6])
         assert x['volume'] == float(cols[7])
+
+
+@pytest.mark.parametrize("symbol", symbols)
+def test_current_bar(symbol):
+    quote = Quote(symbol, quote_path)
+    start, end = quote.date_range()
+    quote.set_current_date(end)
+    x = quote.get_by_opra(symbol)
+    o, h, l, c, v = quote.get_current_bar()
+    assert x['quotedate'] == end
+    assert (o, h, l, c, v) == (x['open'], x['high'], x['low'], x['close'], x['volume'])
+    assert quote.get_current_price() == x['close']
@@ -0,0 +1,45 @@
+import datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+from util import opra_code
+from tyche.chain import Chain
+from tyche.quote import Quote
+from tyche.shared import share_chain, share_quote, attach_chain, attach_quote
+
+
+option_path = '../../option_history/'
+quote_path = '../../quote_history/'
+current_date = dt.datetime(year=2018, month=6, day=7)
+
+
+def _prices(chain_handle, quote_handle):
+    chain = attach_chain('MS', chain_handle)
+    quote = attach_quote('MS', quote_handle)
+    chain.set_current_date(current_date)
+    quote.set_current_date(current_date)
+    row = chain.get_by_opra(opra_code('MS', dt.datetime(year=2018, month=6, day=8), 56, 'Call'))
+    return float(row['Bid']), float(row['Ask']), float(quote.get_current_price())
+
+
+def test_shared_chain_and_quote():
+    chain = Chain('MS', option_path)
+    quote = Quote('MS', quote_path)
+    with share_chain(chain) as shared_chain, share_quote(quote) as shared_quote:
+        attached = attach_chain('MS', shared_chain.handle)
+        assert attached.frame is None
+        assert attached.date_range() == chain.date_range()
+        assert attached.trading_dates().equals(chain.trading_dates())
+        assert not attached._store.column('Bid').flags.writeable
+
+        attached_quote = attach_quote('MS', shared_quote.handle)
+        assert attached_quote.date_range() == quote.date_range()
+
+        chain.set_current_date(current_date)
+        quote.set_current_date(current_date)
+        row = chain.get_by_opra(opra_code('MS', dt.datetime(year=2018, month=6, day=8), 56, 'Call'))
+        expected = (float(row['Bid']), float(row['Ask']), float(quote.get_current_price()))
+        assert _prices(shared_chain.handle, shared_quote.handle) == expected
+
+        # Workers attach by name and read the same rows.
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(_prices, [shared_chain.handle] * 2, [shared_quote.handle] * 2))
+        assert results == [expected, expected]
@@ -0,0 +1,100 @@
+import datetime as dt
+import pytest
+import pandas as pd
+from tyche.stream import iter_csv_days, StreamingChain, StreamingQuote, EndOfHistory, UnsortedHistory
+from tyche.chain import InvalidChainDate
+from tyche.backtest import Backtest, HistoryConsumed
+from adapters.adapter import Adapter
+from strategy.buyhold import BuyHold
+
+
+def _write_chain_csv(fn, dates):
+    rows = []
+    for d in dates:
+        for strike in (40.0, 45.0, 50.0):
+            oc = 'MS180615C{:08d}'.format(int(strike * 1000))
+            rows.append((oc, 'MS', 47.0, 'call', '2018-06-15', d, strike, 1.0, 1.1))
+    frame = pd.DataFrame(rows, columns=['OptionSymbol', 'UnderlyingSymbol', 'UnderlyingPrice', 'Type', 'Expiration',
+                                        'DataDate', 'Strike', 'Bid', 'Ask'])
+    frame.to_csv(fn, index=False)
+
+
+def _chain_days(fn, chunksize):
+    return iter_csv_days(fn, 'DataDate', chunksize, parse_dates=['Expiration', 'DataDate'])
+
+
+def test_iter_csv_days(tmp_path):
+    fn = str(tmp_path / 'MS.csv')
+    dates = ['2018-06-04', '2018-06-05', '2018-06-07']
+    _write_chain_csv(fn, dates)
+    # A chunk size that splits days across chunks must still yield whole days.
+    for chunksize in (2, 3, 4, 100):
+        days = list(_chain_days(fn, chunksize))
+        assert [d for d, _ in days] == [pd.Timestamp(d) for d in dates]
+        assert all(len(day) == 3 for _, day in days)
+
+    _write_chain_csv(fn, ['2018-06-05', '2018-06-04'])
+    with pytest.raises(UnsortedHistory):
+        list(_chain_days(fn, 2))
+
+
+def test_streaming_chain(tmp_path):
+    fn = str(tmp_path / 'MS.csv')
+    _write_chain_csv(fn, ['2018-06-04', '2018-06-05', '2018-06-07'])
+    chain = StreamingChain('MS', _chain_days(fn, 2))
+    assert chain.start_date == pd.Timestamp('2018-06-04')
+
+    chain.set_current_date(dt.datetime(2018, 6, 5))
+    assert chain.get_by_opra('MS180615C00045000')['Strike'] == 45.0
+    assert chain.current['ExpirationType'].iloc[0] == 'Monthly'
+    with pytest.raises(InvalidChainDate):
+        chain.set_current_date(dt.datetime(2018, 6, 4))
+    with pytest.raises(InvalidChainDate):
+        chain.set_current_date(dt.datetime(2018, 6, 6))
+    chain.set_current_date(dt.datetime(2018, 6, 7))
+    assert not chain.has_next()
+    with pytest.raises(EndOfHistory):
+        chain.set_current_date(dt.datetime(2018, 6, 8))
+
+
+def test_streaming_quote(tmp_path):
+    fn = str(tmp_path / 'MS.csv')
+    frame = pd.DataFrame({'symbol': 'MS', 'quotedate': ['2018-06-04', '2018-06-05'], 'open': [1.0, 2.0],
+                          'high': [1.0, 2.0], 'low': [1.0, 2.0], 'close': [1.5, 2.5], 'volume': [10, 20]})
+    frame.to_csv(fn, index=False)
+    quote = StreamingQuote('MS', iter_csv_days(fn, 'quotedate', 1, parse_dates=['quotedate']))
+    quote.set_current_date(dt.datetime(2018, 6, 5))
+    assert quote.get_current_price() == 2.5
+    assert quote.get_by_opra('MS')['volume'] == 20
+
+
+class _CsvAdapter(Adapter):
+
+    def __init__(self, path):
+        super().__init__()
+        self._path = path
+
+    def load_option_csv(self, symbol, columns=None, float_dtype=None):
+        pass
+
+    def load_quote_csv(self, symbol):
+        pass
+
+    def iter_option_days(self, symbol, chunksize=200000, columns=None, float_dtype=None):
+        return _chain_days(self._path + symbol + '.csv', chunksize)
+
+    def iter_quote_days(self, symbol, chunksize=200000):
+        return iter_csv_days(self._path + symbol + '_quotes.csv', 'quotedate', chunksize, parse_dates=['quotedate'])
+
+
+def test_streamed_backtest_runs_once(tmp_path):
+    dates = ['2018-06-04', '2018-06-05', '2018-06-07']
+    _write_chain_csv(str(tmp_path / 'MS.csv'), dates)
+    pd.DataFrame({'symbol': 'MS', 'quotedate': dates, 'open': 47.0, 'high': 48.0, 'low': 46.0,
+                  'close': [47.0, 47.5, 48.0], 'volume': 1000, 'adjustedclose': 47.0}).to_csv(
+        str(tmp_path / 'MS_quotes.csv'), index=False)
+
+    backtest = Backtest('MS', BuyHold, 10000.0, adapter=_CsvAdapter(str(tmp_path) + '/'), verbose=False)
+    assert backtest.run() == 10000.0 + 212 * (48.0 - 47.0)
+    with pytest.raises(HistoryConsumed):
+        backtest.run()
@@ -0,0 +1,43 @@
+from strategy.buyhold import BuyHold
+from tyche.chain import Chain
+from tyche.quote import Quote
+from tyche.backtest import Backtest
+from tyche.sweep import SweepRun, sweep_grid, execute_run, run_sweep
+
+
+option_path = '../../option_history/'
+quote_path = '../../quote_history/'
+
+
+def test_sweep_grid():
+    runs = sweep_grid(['TEAM', 'TLT'], BuyHold, [1000.0, 2000.0], {'a': [1, 2, 3], 'b': ['x']})
+    assert len(runs) == 2 * 3 * 2
+    assert [r.symbol for r in runs[:6]] == ['TEAM'] * 6
+    assert runs[0].strategy_args == {'a': 1, 'b': 'x'}
+    assert {r.starting_balance for r in runs} == {1000.0, 2000.0}
+    assert len(sweep_grid(['TEAM'], BuyHold, [1000.0])) == 1
+
+
+def test_failed_run_is_reported():
+    result = execute_run(SweepRun('NO_SUCH_SYMBOL', BuyHold, 1000.0))
+    assert not result.ok()
+    assert result.net_liquid is None
+    assert 'Error' in result.error
+
+
+def test_sweep_keeps_going_after_failures():
+    runs = [SweepRun('NO_SUCH_SYMBOL', BuyHold, 1000.0), SweepRun('NO_SUCH_SYMBOL', BuyHold, 1000.0, {'x': 1})]
+    results = list(run_sweep(runs, workers=2))
+    assert len(results) == 2
+    assert not any(r.ok() for r in results)
+
+
+def test_preloaded_backtest_runs_repeatably():
+    chain = Chain('MS', option_path)
+    quote = Quote('MS', quote_path)
+    first = Backtest('MS', BuyHold, 100000.0, verbose=False, chain=chain, quote=quote)
+    second = Backtest('MS', BuyHold, 200000.0, verbose=False, chain=chain, quote=quote)
+    net_liquid = first.run()
+    assert net_liquid != 100000.0
+    assert second.run() > net_liquid
+    assert first.run() == net_liquid
@@ -0,0 +1,30 @@
+import os
+import pandas as pd
+from pytest import approx
+from util import add_studies, atm_iv, _prob_itm, write_csv_atomic
+
+
+option_path = '../../option_history/'
+
+
+def test_add_studies_matches_row_wise():
+    frame = pd.read_csv(option_path + 'MS.csv', parse_dates=['Expiration', 'DataDate'], nrows=5000)
+
+    # The original row-by-row computation.
+    distance = frame.apply(lambda row: abs(row['Strike'] - row['UnderlyingPrice']), axis=1)
+    min_atm_idx = distance.groupby([frame['DataDate'], frame['Type']]).idxmin()
+    expected_iv = frame.apply(lambda row: frame['IV'].loc[min_atm_idx.loc[(row['DataDate'], row['Type'])]], axis=1)
+    assert list(atm_iv(frame)) == list(expected_iv)
+
+    rows = frame.assign(ProbITM=expected_iv)
+    expected = rows.apply(lambda row: _prob_itm(row), axis=1)
+    add_studies(frame)
+    assert list(frame['ProbITM']) == approx(list(expected))
+    assert list(frame['OPRA']) == list(frame['OptionSymbol'])
+
+
+def test_write_csv_atomic(tmp_path):
+    fn = str(tmp_path / 'X.csv')
+    write_csv_atomic(pd.DataFrame({'a': [1, 2]}), fn)
+    assert list(pd.read_csv(fn, index_col=0)['a']) == [1, 2]
+    assert os.listdir(str(tmp_path)) == ['X.csv']
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from pytest import approx
+from strategy.buyhold import BuyHold
+from tyche.chain import Chain
+from tyche.quote import Quote
+from tyche.calendar import TradingCalendar
+from tyche.backtest import Backtest
+from tyche.vectorized import run_vectorized, OrderRejected
+
+
+option_path = '../../option_history/'
+quote_path = '../../quote_history/'
+symbols = ['TEAM', 'MS', 'TLT']
+
+
+@pytest.mark.parametrize("symbol", symbols)
+def test_vectorized_matches_event_loop(symbol):
+    chain = Chain(symbol, option_path)
+    quote = Quote(symbol, quote_path)
+    calendar = TradingCalendar(chain, quote)
+    for balance in [100000.0, 12345.67]:
+        loop = Backtest(symbol, BuyHold, balance, verbose=False, chain=chain, quote=quote, calendar=calendar)
+        fast = Backtest(symbol, BuyHold, balance, verbose=False, chain=chain, quote=quote, calendar=calendar,
+                        vectorized=True)
+        expected = loop.run()
+        assert round(fast.run(), 2) == round(expected, 2)
+        assert fast.result is not None
+        assert fast.result.high_balance == approx(loop._broker._high_balance, abs=0.005)
+        assert fast.result.low_balance == approx(loop._broker._low_balance, abs=0.005)
+
+
+def test_rejected_fill():
+    symbol = 'MS'
+    chain = Chain(symbol, option_path)
+    quote = Quote(symbol, quote_path)
+    dates = TradingCalendar(chain, quote).dates
+    close = quote.bars(dates)['close']
+    result = run_vectorized(quote, dates, np.full(len(dates), 10), 10 * close[0])
+    assert list(result.fills[:2]) == [10, 0]
+    assert result.cash[0] == approx(0.0)
+    assert result.equity[1] == approx(10 * close[1])
+    with pytest.raises(OrderRejected):
+        run_vectorized(quote, dates, np.full(len(dates), 11), 10 * close[0])
@@ -2,6 +2,10 @@ import datetime as dt
 from tyche.chain import Chain
 from tyche.quote import Quote
 from tyche.broker import Broker
+from tyche.market import MarketData
+from tyche.calendar import TradingCalendar
+from tyche.stream import StreamingChain, StreamingQuote, EndOfHistory
+from tyche.vectorized import run_vectorized, NotVectorizable, OrderRejected
 
 
 option_path = '../option_history/'
@@ -9,7 +13,8 @@ quote_path = '../quote_history/'
 
 """
 Creates the Broker, Strategy and executes the sim loop for a single backtest.
-Can re-use the Broker (avoid chain load times) by calling broker.reset()  (or does the chain live with the BackTest?)
+The Chain and Quote can be loaded once and handed to many Backtests, and a Backtest can run() again (the Broker is
+reset) to avoid chain load times.
 Broker is told to execute an iteration for a day by the backtest. Broker handles buys, sells, expirations, assignments.
 Broker produces the list of expirations and adjusts positions accordingly. It returns the list of assignments to the
 Backtest so it can invoke Strategy.hand_assignments(list of Positions, Broker)
@@ -19,44 +24,143 @@ broke and done.
 """
 
 
+class HistoryConsumed(Exception):
+    """
+    The backtest streams its history, and an earlier run() already consumed it.
+    """
+    pass
+
+
 class Backtest:
 
-    def __init__(self, symbol, strategy_cls, starting_balance):
+    def __init__(self, symbol, strategy_cls, starting_balance, adapter=None, strategy_args=None, verbose=True,
+                 chain: Chain = None, quote: Quote = None, calendar: TradingCalendar = None, vectorized=False,
+                 memory_budget=None, market: MarketData = None):
+        """
+        :param symbol: Underlying symbol to backtest, or a list of them for a portfolio strategy. The first symbol's
+                       dates drive the backtest; the others are loaded when the strategy or a position first touches
+                       them (see MarketData) and are handed to strategy.prepare() as the whole list.
+        :param strategy_cls: Strategy class, instantiated afresh for every run()
+        :param starting_balance: Initial cash balance
+        :param adapter: If given, stream the chain and quote one day at a time from this Adapter instead of loading
+                        the full histories. Memory then stays around one day of data, the run ends with the stream,
+                        and the Backtest can only run() once.
+        :param strategy_args: dict of keyword arguments for strategy_cls
+        :param verbose: Print the balances at the end of every day
+        :param chain: Preloaded option chain for symbol, shared with other Backtests. Loaded from option_path if None.
+        :param quote: Preloaded quote history for symbol. Loaded from quote_path if None.
+        :param calendar: Preloaded TradingCalendar of chain and quote. Built if None.
+        :param vectorized: Run the whole history at once through tyche.vectorized when the strategy provides
+                           target_positions, falling back to the daily event loop when it does not (or when a fill
+                           would be rejected). The Broker is not used, and nothing is printed per day.
+        :param memory_budget: bytes of chain and quote histories to keep loaded across symbols, None for no limit.
+                              Least recently used symbols beyond it are dropped and reloaded when touched again.
+        :param market: Chains and quotes of the other symbols, shared with other Backtests. Loaded from option_path
+                       and quote_path within memory_budget if None.
+        """
+        self._symbols = symbol
+        if not isinstance(symbol, str):
+            symbol = symbol[0]
         self._symbol = symbol
-        self._chain = Chain(symbol, option_path)
-        self._quote = Quote(symbol, quote_path)
+        if chain is not None or quote is not None:
+            self._chain = chain if chain is not None else Chain(symbol, option_path)
+            self._quote = quote if quote is not None else Quote(symbol, quote_path)
+        elif adapter:
+            self._chain = StreamingChain(symbol, adapter.iter_option_days(symbol))
+            self._quote = StreamingQuote(symbol, adapter.iter_quote_days(symbol))
+        else:
+            self._chain = Chain(symbol, option_path)
+            self._quote = Quote(symbol, quote_path)
         from_dt, to_dt = self._chain.date_range()
-        self._strategy = strategy_cls()
+        self._strategy_cls = strategy_cls
+        self._strategy_args = strategy_args or {}
+        self._strategy = None
         self._start_dt = from_dt
         self._end_dt = to_dt
         self._start_balance = starting_balance
-        self._broker = None
+        self._verbose = verbose
+        self._vectorized = vectorized
+        self.result = None  # VectorizedResult of the last vectorized run
+        # Streamed histories are not known up front, so those are walked a calendar day at a time instead.
+        streaming = isinstance(self._chain, StreamingChain)
+        self._streaming = streaming
+        self._runs = 0
+        if calendar is None and not streaming:
+            calendar = TradingCalendar(self._chain, self._quote)
+        self._calendar = calendar
+        if market is None:
+            market = MarketData(memory_budget, option_path=option_path, quote_path=quote_path)
+        self._broker = Broker(starting_balance, self._chain, self._quote, calendar=self._calendar, market=market)
 
     def run(self):
         """
-
-        :return:
+        Run the backtest over the whole history. May be called again, unless streamed; the Broker starts over each time.
+        :return: net liquid value at the end of the run
+        :raises HistoryConsumed: run again over a streamed history
         """
-        one_day = dt.timedelta(days=1)
+        if self._streaming and self._runs:
+            raise HistoryConsumed("A streamed backtest of {} can only run once".format(self._symbol))
+        self._runs += 1
+        self._broker.reset(self._start_balance)
+        self._strategy = self._strategy_cls(**self._strategy_args)
+        self._strategy.prepare(self._symbols)
+        self.result = None
 
-        self._broker = Broker(100000.0, self._chain, self._quote)
-        self._strategy.prepare(self._symbol)
+        if self._vectorized and self._calendar is not None:
+            try:
+                self.result = self._run_vectorized()
+                return self.result.net_liquid()
+            except (NotVectorizable, OrderRejected):
+                pass
 
         current_date = self._start_dt
-        while current_date < self._end_dt:
+        while current_date is not None:
 
-            self._broker.open_current_date(current_date)
+            try:
+                current_date = self._broker.open_current_date(current_date)
+            except EndOfHistory:
+                break
             self._strategy.update(current_date, self._broker)
 
             assigned_shares_count = self._broker.close_current_date()
             if assigned_shares_count:
-                self._strategy.assignment(assigned_shares_count, self._symbol, current_date, self._broker)
+                for symbol, count in self._broker.assignments().items():
+                    if count:
+                        self._strategy.assignment(count, symbol, current_date, self._broker)
 
-            print("Day {}\tcash: ${:.2f}\tobp: ${:.2f}\tnet-liquid: ${:.2f}".format(
-                  current_date.date(),
-                  self._broker.stock_buying_power(),
-                  self._broker.option_buying_power(self._broker.stock_buying_power()),
-                  self._broker.net_liquid()))
+            if self._verbose:
+                print("Day {}\tcash: ${:.2f}\tobp: ${:.2f}\tnet-liquid: ${:.2f}".format(
+                      current_date.date(),
+                      self._broker.stock_buying_power(),
+                      self._broker.option_buying_power(self._broker.stock_buying_power()),
+                      self._broker.net_liquid()))
 
             # Advance!
-            current_date = current_date + one_day
+            current_date = self._next_date(current_date)
+
+        return self._broker.net_liquid()
+
+    def _run_vectorized(self):
+        """
+        :return: VectorizedResult over the trading days of the backtest
+        :raises NotVectorizable: the strategy has no target_positions
+        """
+        dates = self._calendar.between(self._start_dt, self._end_dt)
+        bars = self._quote.bars(dates)
+        targets = self._strategy.target_positions(dates, bars, self._start_balance)
+        if targets is None:
+            raise NotVectorizable()
+        return run_vectorized(self._quote, dates, targets, self._start_balance)
+
+    def _next_date(self, current_date):
+        """
+        :param current_date: trading day just completed
+        :return: the next day to open, or None when the backtest is done
+        """
+        if self._calendar is None:
+            # Streaming: step a calendar day, the Broker rolls forward to the next day in the stream.
+            return current_date + dt.timedelta(days=1)
+        i = self._calendar.position(current_date) + 1
+        if i >= len(self._calendar) or self._calendar.dates[i] > self._end_dt:
+            return None
+        return self._calendar.dates[i]
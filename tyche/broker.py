@@ -4,47 +4,42 @@ from tyche.chain import Chain, InvalidChainDate
 from tyche.quote import Quote, InvalidQuoteDate
 from tyche.portfolio import Portfolio
 from tyche.position import Position
+from tyche.calendar import TradingCalendar
+from tyche.market import MarketData
 
 
 class Broker:
     """
     Broker is a set of methods used by the Strategy to perform it's inner loop, daily evaluation during a backtest.
     A larger, outer object will run multiple backtests with multiple symbols, time ranges, params and strategies.
-    For now, consider a broker a one-use, expensive object.
+    A broker trades any number of underlyings through a MarketData, which loads each one as it is touched; the
+    chain and quote it is given are its primary symbol's. Call reset() to start another backtest over the same data.
     """
 
-    def __init__(self, starting_balance, chain: Chain, quote: Quote, margin_multiple=0.3):
+    def __init__(self, starting_balance, chain: Chain = None, quote: Quote = None, margin_multiple=0.3,
+                 calendar: TradingCalendar = None, market: MarketData = None):
         """
-        Initialize the broker for a backtest. Must be created for each backtest run - not yet reusable.
+        Initialize the broker for a backtest. Reuse it for another run over the same chain and quote with reset().
         :param starting_balance: Initial balance for the account
-        :param chain: option chain for evaluating derivative positions
-        :param quote: quote history for evaluating equity positions
+        :param chain: option chain of the primary symbol, whose dates the broker follows
+        :param quote: quote history of the primary symbol
         :param margin_multiple: ratio of intrinsic option impact to cash that must be held in reserve
+        :param calendar: trading days of chain and quote. Without one, non-trading days are found by trial.
+        :param market: chains and quotes of every other symbol traded. Positions are priced, expired and assigned
+                       from their own underlying's. A MarketData without a memory budget if None.
         """
 
-        # Current datetime in the backtest. *Should only roll forward.*
-        self._current_date = None
-
-        # Portfolio holds this list of open and closed orders at the Brokerage
-        self._portfolio = Portfolio()
-
-        # Maximum HighBalance, LowBalance for this backtest
-        self._high_balance = starting_balance
-        self._low_balance = starting_balance
-
-        # Current cash balance. Adjusted after each order is placed or day ends.
-        self._cash_balance = starting_balance
-
         # Discount for covering with cash. $10 with a margin multiple of 0.5 yields $20 of option buying power
         self._margin_multiple = margin_multiple
 
-        # Total money of covering margin we have for making option trades. Does not include cash.
-        self._cover_shares = 0
-
-        # Chain and Quote hold the prices, etc. for all traded symbols
+        # Chain and Quote hold the prices, etc. for the primary symbol, the market for all traded symbols
         self._chain: Chain = chain
         self._quote: Quote = quote
-        self._underlying_price = 0.0
+        self._symbol = chain.symbol if chain is not None else None
+        self._market = market if market is not None else MarketData()
+        if chain is not None:
+            self._market.add(self._symbol, chain, quote)
+        self._calendar = calendar
 
         self._order_codes = [
             "Order Placed",
@@ -56,13 +51,49 @@ class Broker:
             "Not Filled at That Price"
         ]
 
+        self.reset(starting_balance)
+
+    def reset(self, starting_balance):
+        """
+        Clear the account for a new backtest over the same chain and quote: empty Portfolio, fresh balances and no
+        current date. The chain and quote are kept, so nothing is reloaded.
+        A streaming chain or quote cannot be rewound, so a broker over one is not reusable.
+        :param starting_balance: Initial balance for the account
+        """
+        # Current datetime in the backtest. *Should only roll forward.*
+        self._current_date = None
+
+        # Portfolio holds this list of open and closed orders at the Brokerage
+        self._portfolio = Portfolio()
+
+        # Maximum HighBalance, LowBalance for this backtest
+        self._high_balance = starting_balance
+        self._low_balance = starting_balance
+
+        # Current cash balance. Adjusted after each order is placed or day ends.
+        self._cash_balance = starting_balance
+
+        # Shares of covering margin we have for making option trades, by underlying. Does not include cash.
+        self._cover_shares = {}
+
+        # Shares assigned by underlying at the last close_current_date
+        self._assigned = {}
+
     def open_current_date(self, current_date: dt.datetime):
         """
         Acts as the entry point for a new simulation state. Must be called before placing orders or handling
         expirations.
+        A date that is not a trading day rolls forward to the next one.
         :param current_date:
-        :return:
+        :return: the trading date actually opened
         """
+        if self._calendar is not None:
+            trading_date = self._calendar.next_on_or_after(current_date)
+            if trading_date is None:
+                raise InvalidChainDate("Date is past the end of the trading calendar")
+            self._open_trading_date(trading_date)
+            return trading_date
+
         # First verify current date is valid
         # We'll automatically skip the weekends (Mon is 0, Sunday is 6)
         if current_date.weekday() > 4:
@@ -72,11 +103,7 @@ class Broker:
         valid_date = False
         while not valid_date:
             try:
-                self._quote.set_current_date(current_date)
-                self._chain.set_current_date(current_date)
-                self._current_date = current_date
-                self._underlying_price = self._quote.get_current_price()
-                self._portfolio.update_prices(self._chain, self._quote)
+                self._open_trading_date(current_date)
                 valid_date = True
             except InvalidQuoteDate:
                 # Nope, try again.
@@ -86,10 +113,19 @@ class Broker:
                 current_date = current_date + dt.timedelta(days=1)
         return current_date
 
+    def _open_trading_date(self, current_date):
+        self._market.set_current_date(current_date)
+        if self._symbol is not None:
+            # Validates the date: the primary symbol must trade on it. Other symbols may have no chain that day.
+            self._market.quote(self._symbol, required=True)
+            self._market.chain(self._symbol, required=True)
+        self._current_date = current_date
+        self._portfolio.update_prices(self._market)
+
     def close_current_date(self):
         """
         Up to invoking class to deal with assignments as seen fit.
-        :return: Count of shares assigned
+        :return: Count of shares assigned, over all underlyings (see assignments())
         """
         cnt_assigned = self._handle_expirations()
         self._low_balance = min(self._low_balance, self._cash_balance)
@@ -97,11 +133,25 @@ class Broker:
         # TODO: handle margin calls and such here, or possibly end backtest.
         return cnt_assigned
 
-    def option_chain(self):
-        return self._chain
+    def assignments(self):
+        """
+        :return: dict of underlying -> shares assigned at the last close_current_date
+        """
+        return self._assigned
 
-    def stock_quote(self):
-        return self._quote
+    def option_chain(self, symbol=None):
+        """
+        :param symbol: Underlying symbol, the primary symbol if None
+        :return: its option chain on the current date, loaded on first use. None if the symbol has no chain that day.
+        """
+        return self._market.chain(symbol or self._symbol)
+
+    def stock_quote(self, symbol=None):
+        """
+        :param symbol: Symbol, the primary symbol if None
+        :return: its quote on the current date, loaded on first use. None if the symbol has no quote that day.
+        """
+        return self._market.quote(symbol or self._symbol)
 
     def place_order(self, positions):
         """
@@ -122,18 +172,36 @@ class Broker:
         # Set current price on the positions provided by the Strategy.
         for p in positions:
             p.entry_price = self._get_current_position_price(p)
+            if p.entry_price is None:
+                # Not traded today: an option without chain rows, or a stock without a quote.
+                status_code = 3 if p.is_option() else 4
+                return -status_code, self._order_codes[status_code]
 
         # Compute impact to marginable_shares and cash.
         # i.e. if there are marginable shares, then each sold option can impact that count.
         # Any such order not covered will impact cash by the margin multiple.
-        total_cost, total_cover = self._get_total_costs_to_place(positions)
+        # Covering shares are counted per underlying and valued at that underlying's price.
+        total_cost = 0.0
+        covers = {}
+        for symbol in {p.underlying for p in positions}:
+            cost, cover = self._get_total_costs_to_place([p for p in positions if p.underlying == symbol])
+            total_cost += cost
+            covers[symbol] = cover
 
         if total_cost > self._cash_balance:
             status_code = 1
             return -status_code, self._order_codes[status_code]
 
         option_buy_power = self.option_buying_power(self._cash_balance - total_cost)
-        if total_cover * self._underlying_price > option_buy_power:
+        cover_value = 0.0
+        for symbol, cover in covers.items():
+            if cover:
+                price = self._underlying_price(symbol)
+                if price is None:
+                    status_code = 4
+                    return -status_code, self._order_codes[status_code]
+                cover_value += cover * price
+        if cover_value > option_buy_power:
             status_code = 2
             return -status_code, self._order_codes[status_code]
 
@@ -142,7 +210,8 @@ class Broker:
                                       p.strike, self._current_date, p.entry_price)
 
         self._cash_balance -= total_cost
-        self._cover_shares -= total_cover
+        for symbol, cover in covers.items():
+            self._cover_shares[symbol] = self._cover_shares.get(symbol, 0) - cover
 
         return -status_code, self._order_codes[status_code]
 
@@ -160,8 +229,12 @@ class Broker:
         :return: money buying power
         """
         bp = 0.0
-        if self._cover_shares > 0:
-            bp = self._cover_shares * self._underlying_price
+        for symbol, shares in self._cover_shares.items():
+            if shares > 0:
+                # Shares without a quote today give no buying power; do not load a chain just to price them.
+                price = self._stock_price(symbol)
+                if price is not None:
+                    bp += shares * price
         bp += cash_available / self._margin_multiple
         return bp
 
@@ -201,6 +274,7 @@ class Broker:
         :return: List of positions created by assignment
         """
         assigned_positions = 0
+        self._assigned = {}
         expiry = self._portfolio.expire_positions(self._current_date)
         if expiry:
             # Handle long/short itm/otm and then close all expired positions.
@@ -218,22 +292,55 @@ class Broker:
                         self._handle_assigned_call(p)
                     elif p.is_put() and p.strike >= current_underlying_price:
                         # Short Put expired: Must buy the stock at the strike.
-                        assigned_positions += self._handle_assigned_put(p)
+                        assigned = self._handle_assigned_put(p)
+                        assigned_positions += assigned
+                        self._assigned[p.underlying] = self._assigned.get(p.underlying, 0) + assigned
             # Clean up all these expired positions.
             self._portfolio.expire_positions(self._current_date)
         return assigned_positions
 
+    def _stock_price(self, symbol):
+        """
+        :return: the symbol's current price, None if it has no quote today
+        """
+        quote = self._market.quote(symbol)
+        return None if quote is None else quote.get_current_price()
+
+    def _underlying_price(self, symbol):
+        """
+        :return: the symbol's current price from its quote, or else from its chain; None if it has neither today
+        """
+        price = self._stock_price(symbol)
+        if price is None:
+            chain = self._market.chain(symbol)
+            if chain is not None and len(chain.current):
+                price = chain.current['UnderlyingPrice'].iloc[0]
+        return price
+
     def _get_current_position_price(self, p: Position):
+        """
+        :return: the position's current price, None for an option whose underlying has no chain today
+        """
         if p.is_option():
-            price = self._chain.get_current_price(p.opra_code(), p.quantity)
+            chain = self._market.chain(p.underlying)
+            if chain is None:
+                return None
+            price = chain.get_current_price(p.contract_key(), p.quantity)
         else:
-            price = self._quote.get_current_price()
+            price = self._stock_price(p.underlying)
         return price
 
     def _get_current_underlying_price(self, p: Position):
-        oc = p.opra_code()
         if p.is_option():
-            price = self._chain.get_current_underlying_price(oc)
+            chain = self._market.chain(p.underlying)
+            if chain is None:
+                # No chain rows today; the stock's own quote is the underlying price.
+                price = self._stock_price(p.underlying)
+                if price is None:
+                    raise InvalidQuoteDate("No {} quote or chain on {} to expire {}".format(
+                        p.underlying, self._current_date, p.opra_code()))
+                return price
+            price = chain.get_current_underlying_price(p.contract_key())
             return price
         return 0.0  # OR throw an exception here
 
@@ -250,7 +357,7 @@ class Broker:
                                                      p.strike,
                                                      reconcile_only=True)
         if uncovered_shares:
-            self._cash_balance -= uncovered_shares * self._quote.get_current_price()
+            self._cash_balance -= uncovered_shares * self._underlying_price(p.underlying)
         # Verify the option p has current_price  0.0
 
     def _handle_assigned_put(self, p: Position):
@@ -0,0 +1,122 @@
+import os
+import glob
+import hashlib
+import inspect
+import pandas as pd
+
+# Bump when the layout of cached frames changes so old caches are ignored.
+cache_version = 4
+cache_dir = '.cache'
+
+
+def source_key(fn, tag=''):
+    """
+    :param fn: Path of the raw CSV file
+    :param tag: Extra text describing how the frame built from the file was prepared
+    :return: short hash of the file's path, size and mtime and the tag
+    """
+    st = os.stat(fn)
+    text = '|'.join([os.path.abspath(fn), str(st.st_size), str(st.st_mtime_ns), tag, str(cache_version)])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def tag_key(tag=''):
+    """
+    :param tag: see FrameCache
+    :return: short hash of the tag alone, shared by every cache built with it
+    """
+    return hashlib.sha1(tag.encode('utf-8')).hexdigest()[:8]
+
+
+class FrameCache:
+
+    def __init__(self, fn, tag=''):
+        """
+        A binary on-disk copy of a prepared frame built from a raw CSV file. The cache lives next to the CSV in a
+        .cache directory and is keyed by the CSV's path, size and mtime, plus a tag describing how the frame was
+        prepared (derived columns, etc). Any change to those writes a new cache and removes the stale ones of the same
+        tag; caches of other tags (e.g. other column sets) are left for the configurations that use them.
+        :param fn: Path of the raw CSV file
+        :param tag: Extra text that must match for the cache to be valid, e.g. names of derived columns.
+        """
+        self.fn = fn
+        self.tag = tag
+        base = os.path.basename(fn)
+        self._dir = os.path.join(os.path.dirname(fn), cache_dir)
+        self._prefix = os.path.join(self._dir, '{}.{}.'.format(base, tag_key(tag)))
+        self.cache_fn = self._prefix + source_key(fn, tag) + '.pkl'
+
+    def load(self):
+        """
+        :return: the cached frame, or None if there is no valid cache
+        """
+        if not os.path.exists(self.cache_fn):
+            return None
+        try:
+            return pd.read_pickle(self.cache_fn)
+        except Exception:
+            # Treat a damaged cache as missing; it will be rewritten.
+            return None
+
+    def save(self, frame):
+        """
+        Write the frame atomically and drop any older caches of the same CSV and tag.
+        :param frame: prepared frame to cache
+        """
+        try:
+            os.makedirs(self._dir, exist_ok=True)
+            tmp_fn = self.cache_fn + '.{}.tmp'.format(os.getpid())
+            frame.to_pickle(tmp_fn)
+            os.replace(tmp_fn, self.cache_fn)
+            for old_fn in glob.glob(glob.escape(self._prefix) + '*.pkl'):
+                if old_fn != self.cache_fn:
+                    os.remove(old_fn)
+        except OSError:
+            # A read-only data directory just means no cache.
+            pass
+
+
+def load_frame(fn, prepare, tag='', use_cache=True, save=True):
+    """
+    Load a prepared frame, from the binary cache when it is valid, or else by calling prepare() and caching the result.
+    :param fn: Path of the raw CSV file
+    :param prepare: callable returning the prepared frame from the raw CSV
+    :param tag: see FrameCache
+    :param use_cache: False to always call prepare() and not touch the cache
+    :param save: False to use an existing cache but not write one, e.g. when the frame goes into a ColumnStore instead
+    :return: pandas DataFrame
+    """
+    if not use_cache:
+        return prepare()
+    cache = FrameCache(fn, tag)
+    frame = cache.load()
+    if frame is None:
+        frame = prepare()
+        if save:
+            cache.save(frame)
+    return frame
+
+
+def function_hash(f):
+    """
+    :param f: a column function
+    :return: short hash of its source, or of its bytecode and constants when the source is unavailable
+    """
+    try:
+        text = inspect.getsource(f).encode('utf-8')
+    except (OSError, TypeError):
+        code = getattr(f, '__code__', None)
+        text = code.co_code + repr(code.co_consts).encode('utf-8') if code else repr(f).encode('utf-8')
+    return hashlib.sha1(text).hexdigest()[:8]
+
+
+def column_tag(col_fns: dict = None):
+    """
+    :param col_fns: name -> column function mapping as used by Chain and Quote
+    :return: cache tag identifying the derived columns, including the code of each function so that editing one
+             invalidates the columns it cached
+    """
+    if not col_fns:
+        return ''
+    return ','.join('{}={}.{}#{}'.format(name, f.__module__, f.__qualname__, function_hash(f))
+                    for name, f in col_fns.items())
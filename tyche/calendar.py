@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from tyche.chain import Chain
+from tyche.quote import Quote
+
+
+class TradingCalendar:
+
+    def __init__(self, chain: Chain, quote: Quote):
+        """
+        The days a backtest can trade: dates that have both an option chain and a stock quote.
+        Built once, so weekends, holidays and gaps in the data are never probed day by day.
+        :param chain: option chain history
+        :param quote: quote history for the same symbol
+        """
+        self.dates = pd.DatetimeIndex(np.intersect1d(chain.trading_dates().values, quote.trading_dates().values))
+
+    def __iter__(self):
+        return iter(self.dates)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, d):
+        return self.position(d) is not None
+
+    def position(self, d):
+        """
+        :param d: date
+        :return: index of the date in the calendar, or None if it is not a trading day
+        """
+        i = self.dates.searchsorted(pd.Timestamp(d))
+        if i < len(self.dates) and self.dates[i] == d:
+            return int(i)
+        return None
+
+    def next_on_or_after(self, d):
+        """
+        :param d: date
+        :return: the first trading day on or after d, or None if d is past the end of the calendar
+        """
+        i = self.dates.searchsorted(pd.Timestamp(d))
+        if i < len(self.dates):
+            return self.dates[i]
+        return None
+
+    def between(self, start, end):
+        """
+        :return: trading days from start through end, inclusive
+        :rtype: pd.DatetimeIndex
+        """
+        a = self.dates.searchsorted(pd.Timestamp(start))
+        b = self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return self.dates[a:b]
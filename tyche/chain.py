@@ -1,6 +1,10 @@
 import numpy as np
 import pandas as pd
 import datetime as dt
+from util import vectorized, apply_column_function, contract_key_from_opra, contract_keys_from_frame
+from tyche.cache import load_frame, column_tag
+from tyche.store import open_store
+from tyche.chainfilter import ChainDayIndex, compile_filter, nearest, type_code
 
 option_path = '../../option_history/'
 quote_path = '../../quote_history/'
@@ -13,6 +17,32 @@ quote_path = '../../quote_history/'
 #   0.3 | 1 | 0 | 0 | 0 | TEAM180615C00020000
 # TODO: use enumerated column names to allow for other file formats.
 
+# Column schema used to load option histories compactly. Repeated strings load as categoricals (OptionSymbol repeats
+# once per day a contract trades), floats at a configurable precision. Required columns are always loaded.
+option_date_columns = ['Expiration', 'DataDate']
+option_string_columns = ['OptionSymbol', 'UnderlyingSymbol', 'Exchange', 'OptionExt', 'Type', 'AKA']
+option_float_columns = ['UnderlyingPrice', 'Strike', 'Last', 'Bid', 'Ask', 'IV', 'Delta', 'Gamma', 'Theta', 'Vega',
+                        'ProbITM']
+option_required_columns = ['OptionSymbol', 'UnderlyingSymbol', 'UnderlyingPrice', 'Type', 'Expiration', 'DataDate',
+                           'Strike', 'Bid', 'Ask']
+
+
+def option_csv_options(columns=None, float_dtype=None):
+    """
+    Keyword arguments for pandas.read_csv to load an option history with the compact schema.
+    :param columns: Columns to load in addition to the required ones. None loads every column in the file.
+    :param float_dtype: dtype for the price, IV and greek columns, e.g. 'float32'. None keeps float64.
+    :return: dict of read_csv keyword arguments
+    """
+    dtypes = {col: 'category' for col in option_string_columns}
+    if float_dtype:
+        dtypes.update({col: float_dtype for col in option_float_columns})
+    options = {'parse_dates': option_date_columns, 'dtype': dtypes}
+    if columns is not None:
+        wanted = set(columns) | set(option_required_columns)
+        options['usecols'] = lambda col: col in wanted
+    return options
+
 
 def expiration_type_from_row(row):
     d = row['Expiration']
@@ -26,7 +56,45 @@ def expiration_type_from_date(d):
         return 'Weekly'
 
 
-column_functions = {'ExpirationType': expiration_type_from_row}
+@vectorized
+def expiration_type_from_frame(frame):
+    """
+    Whole-column version of expiration_type_from_row: the third Friday of the month is Monthly, all else Weekly.
+    """
+    exp = frame['Expiration'].dt
+    monthly = (exp.weekday == 4) & (exp.day >= 15) & (exp.day <= 21)
+    return pd.Categorical(np.where(monthly, 'Monthly', 'Weekly'), categories=['Monthly', 'Weekly'])
+
+
+column_functions = {'ExpirationType': expiration_type_from_frame}
+
+
+def expiration_calendar(data_dates, expirations):
+    """
+    The expirations available on each day of a chain history, for Chain.find_expiration.
+    :param data_dates: DataDate column as datetime64[ns], sorted
+    :param expirations: Expiration column as datetime64[ns], sorted within each DataDate
+    :return: dict of DataDate -> (sorted array of expirations, sorted array of just the monthly ones)
+    """
+    data_dates = np.asarray(data_dates, dtype='datetime64[ns]')
+    expirations = np.asarray(expirations, dtype='datetime64[ns]')
+    # First row of every (DataDate, Expiration) pair.
+    first = np.ones(len(expirations), dtype=bool)
+    first[1:] = (data_dates[1:] != data_dates[:-1]) | (expirations[1:] != expirations[:-1])
+    data_dates, expirations = data_dates[first], expirations[first]
+
+    # Same rule as the frame's ExpirationType column.
+    monthly = np.asarray(expiration_type_from_frame(pd.DataFrame({'Expiration': expirations})) == 'Monthly')
+    uniq, starts = np.unique(data_dates, return_index=True)
+    stops = np.append(starts[1:], len(data_dates))
+    calendar = {}
+    for d, a, b in zip(uniq, starts, stops):
+        calendar[pd.Timestamp(d)] = (expirations[a:b], expirations[a:b][monthly[a:b]])
+    return calendar
+
+
+# Order of the rows of a prepared chain history.
+chain_sort_columns = ['DataDate', 'Expiration', 'Type', 'Strike']
 
 
 class InvalidChainDate(Exception):
@@ -35,10 +103,19 @@ class InvalidChainDate(Exception):
 
 class Chain:
 
-    def __init__(self, symbol, path=None):
+    def __init__(self, symbol, path=None, use_cache=True, memory_map=False, columns=None, float_dtype=None,
+                 store=None):
         """
         An option chain collection defined by a symbol. Loads the CSV file from the option_history directory.
         :param symbol: Underlying symbol.
+        :param path: Directory holding the option history CSV files.
+        :param use_cache: Load from (and save to) the binary cache of the prepared frame next to the CSV.
+        :param memory_map: Keep the history in a memory-mapped column store on disk instead of a DataFrame.
+                           self.frame is then None and only the current day's rows are read into memory.
+        :param columns: Columns to load besides those Chain itself needs. None loads all of them.
+        :param float_dtype: Precision for the price, IV and greek columns, e.g. 'float32'. None keeps float64.
+        :param store: An open ColumnStore of the prepared history (e.g. tyche.shared.attach_chain) to read instead
+                      of the CSV. Behaves like memory_map.
         """
         self.frame = None
         self.current = None
@@ -47,12 +124,21 @@ class Chain:
         self.end_date = None
         self.symbol = symbol
         self.option_path = path if path else option_path
+        self.use_cache = use_cache
+        self.memory_map = memory_map or store is not None
+        self.columns = columns
+        self.float_dtype = float_dtype
+        self._store = store
+        self._date_index = {}  # DataDate -> (first row, last row + 1) in the sorted frame
+        self._day_index = None  # ChainDayIndex of the current day, built on first use
+        self._expiration_calendar = {}  # DataDate -> (expirations, monthly expirations), see expiration_calendar
+        self._expirations = None  # the current day's entry of _expiration_calendar
         self._cache_frame(col_fns=column_functions)
 
     def set_current_date(self, current_date):
         """
         Initialize the option chain to a frame and starting date.
-        The frame should be indexed by the opra code - that should be unique for a given day
+        The frame is indexed by contract key (see util.contract_key) - that should be unique for a given day
         :param current_date: First datadate (calendar date) of the chain to load. Not to be confused with expirations.
         :type current_date: date
         """
@@ -66,7 +152,27 @@ class Chain:
     def date_range(self):
         return self.start_date, self.end_date
 
+    def trading_dates(self):
+        """
+        :return: every DataDate with a chain, in order
+        :rtype: pd.DatetimeIndex
+        """
+        return pd.DatetimeIndex(sorted(self._date_index))
+
+    def get_by_key(self, key):
+        """
+        :param key: contract key from util.contract_key or Position.contract_key()
+        :return: the current day's row for the contract
+        """
+        return self.current.loc[key]
+
     def get_by_opra(self, opra_code):
+        """
+        :param opra_code: OPRA code or contract key
+        :return: the current day's row for the contract
+        """
+        if isinstance(opra_code, str):
+            opra_code = contract_key_from_opra(opra_code)
         return self.current.loc[opra_code]
 
     def get_current_price(self, opra_code, position_size):
@@ -77,6 +183,20 @@ class Chain:
             price = row['Ask']
         return price
 
+    def get_current_prices(self, keys, position_sizes):
+        """
+        Vectorized get_current_price: one index lookup for a whole set of contracts.
+        :param keys: array of contract keys
+        :param position_sizes: array of quantities; longs are priced at the Bid, shorts at the Ask
+        :return: array of prices
+        """
+        rows = self.current.index.get_indexer(keys)
+        if (rows < 0).any():
+            raise KeyError(np.asarray(keys)[rows < 0].tolist())
+        bid = self.current['Bid'].to_numpy()[rows]
+        ask = self.current['Ask'].to_numpy()[rows]
+        return np.where(np.asarray(position_sizes) > 0, bid, ask)
+
     def get_current_underlying_price(self, opra_code):
         row = self.get_by_opra(opra_code)
         price = row['UnderlyingPrice']
@@ -86,41 +206,109 @@ class Chain:
         tmp = self.current.query(query)
         return tmp
 
+    def filter(self, spec):
+        """
+        Structured replacement for query(): select the current day's contracts by column ranges.
+        e.g. chain.filter({'Type': 'put', 'Expiration': (exp,), 'Strike': (40, 50), 'Delta': (-0.35, -0.25)})
+        Expiration, Type and Strike are binary searched on the day's (Expiration, Type, Strike) order.
+        :param spec: ChainFilter, or dict of column -> range (see tyche.chainfilter.ChainFilter)
+        :return: the matching rows of the current chain; a view when they are contiguous
+        """
+        return self.current.iloc[self.filter_positions(spec)]
+
+    def filter_positions(self, spec):
+        """
+        :param spec: as filter()
+        :return: positions of the matching rows in the current chain, a slice when they are contiguous
+        """
+        return compile_filter(spec).positions(self.day_index(), self.current)
+
+    def nearest_strike(self, expiration, opt_type, price):
+        """
+        :param expiration: expiration date
+        :param opt_type: 'call' or 'put' (or 'C'/'P')
+        :param price: target strike, e.g. the underlying price for the ATM contract
+        :return: contract key of the contract with the closest strike (the lower on a tie), None if there is none
+        """
+        return self.strikes_away(expiration, opt_type, price, 0)
+
+    def strikes_away(self, expiration, opt_type, price, k):
+        """
+        :param expiration: expiration date
+        :param opt_type: 'call' or 'put' (or 'C'/'P')
+        :param price: reference price; the ladder is entered at the strike nearest to it
+        :param k: strikes to move up (positive) or down (negative) the ladder from there
+        :return: contract key, or None if the ladder does not reach that far
+        """
+        index = self.day_index()
+        g = index.group(pd.Timestamp(expiration).value, type_code(opt_type))
+        if g is None:
+            return None
+        start, strikes = index.strike_ladder(g)
+        i = nearest(strikes, price)
+        if i is None or not 0 <= i + k < len(strikes):
+            return None
+        return self._key_at(start + i + k)
+
+    def nearest_delta(self, expiration, opt_type, delta):
+        """
+        :param expiration: expiration date
+        :param opt_type: 'call' or 'put' (or 'C'/'P')
+        :param delta: target delta, e.g. -0.30 for a 30-delta put
+        :return: contract key of the contract with the closest delta (the lower on a tie), None if there is none
+        """
+        index = self.day_index()
+        g = index.group(pd.Timestamp(expiration).value, type_code(opt_type))
+        if g is None:
+            return None
+        positions, deltas = index.delta_ladder(g, self.current['Delta'].to_numpy())
+        i = nearest(deltas, delta)
+        if i is None:
+            return None
+        return self._key_at(positions[i])
+
+    def _key_at(self, position):
+        """
+        :param position: sorted position in the current day's ChainDayIndex
+        :return: contract key of the row there
+        """
+        return int(self.current.index[self.day_index().rows(position)])
+
+    def day_index(self):
+        """
+        :return: ChainDayIndex of the current day
+        """
+        if self._day_index is None:
+            self._day_index = ChainDayIndex(self.current)
+        return self._day_index
+
     def find_expiration(self, ref_date: dt.datetime, min_days_out, weekly=True):
         """
         Locate the expiration that is distance from reference date. Allow for weekly expiration if flagged.
+        A binary search of the current day's precomputed expirations (see expiration_calendar).
         :param ref_date: Date we want an expiry to be based off of.
-        :param min_days_out: Minimum number of days past the reference date. Must be greater than or equal to 0
-        :param weekly:
-        :return:
+        :param min_days_out: Days past (or, if negative, before) the reference date. Going forward, the first
+                             expiration on or after the shifted date is returned; going back, the last one on or before.
+        :param weekly: False to consider only monthly expirations
+        :return: the expiration, or None if there is no qualifying one
         """
 
         # Shift the reference date by the requested amount, then search on the correct side for it.
-        ref_date = ref_date + dt.timedelta(days=min_days_out)
-
-        # Let's get the list of all expiration dates.
-        # Note that everything is done in datetime64 in numpy/pandas
-        expirs = self.current['Expiration'].dt.to_pydatetime()
-        expirs = np.unique(expirs)
-        expirs.sort()
+        ref_date = np.datetime64(pd.Timestamp(ref_date + dt.timedelta(days=min_days_out)), 'ns')
+        expirs, monthly = self._expirations
+        candidates = expirs if weekly else monthly
 
         # Are we going forward from current?
         if min_days_out >= 0:
-            current_date_limit = self.current["Expiration"].max()
-            if ref_date > current_date_limit:
-                raise Exception("Date exceed current chain (max is {})".format(current_date_limit))
-            for exp in expirs:
-                # Have we reached a qualifying expiration (past min_days_out and not weekly if not allowed)
-                if exp >= ref_date and (weekly or 'Weekly' != expiration_type_from_date(exp)):
-                    # Found one!
-                    return exp
+            if ref_date > expirs[-1]:
+                raise Exception("Date exceed current chain (max is {})".format(pd.Timestamp(expirs[-1])))
+            i = np.searchsorted(candidates, ref_date, 'left')
         else:
-            current_date_limit = self.current["Expiration"].min()
-            if ref_date < current_date_limit:
-                raise Exception("Date exceed current chain (min is {})".format(current_date_limit))
-            for exp in np.flip(expirs):
-                if exp <= ref_date and (weekly or 'Weekly' != expiration_type_from_date(exp)):
-                    return exp
+            if ref_date < expirs[0]:
+                raise Exception("Date exceed current chain (min is {})".format(pd.Timestamp(expirs[0])))
+            i = np.searchsorted(candidates, ref_date, 'right') - 1
+        if 0 <= i < len(candidates):
+            return pd.Timestamp(candidates[i]).to_pydatetime()
         return None
 
     def _cache_frame(self, col_fns: dict = None):
@@ -128,59 +316,90 @@ class Chain:
         Load the entire option history file for the given symbol into memory.
         Optionally, apply any columns to the frame
         Slice out the current date chain.
+        The prepared frame (derived columns, sorted and indexed) is cached on disk, so only the first load parses CSV.
         """
         # TODO: Use the input adapter here to read the thing and rename columns to Tyche standard.
 
         fn = self.option_path + self.symbol + '.csv'
-        option_date_cols = ['Expiration', 'DataDate']
-        self.frame = pd.read_csv(fn, parse_dates=option_date_cols)
-        if col_fns:
-            for name, fn in col_fns.items():
-                self._add_column_to_frame(name, fn)
-        self.frame.sort_values(by='DataDate', inplace=True)
+        tag = column_tag(col_fns) + '|columns={}|float={}'.format(
+            sorted(self.columns) if self.columns is not None else None, self.float_dtype)
+        if self.memory_map:
+            if self._store is None:
+                # The full frame is only needed once, to build the store, which is then its only binary copy.
+                self._store = open_store(fn, lambda: load_frame(fn, lambda: self._read_frame(fn, col_fns), tag,
+                                                                self.use_cache, save=False),
+                                         'DataDate', tag)
+            self.frame = None
+            self.start_date = pd.Timestamp(self._store.dates[0])
+            self.end_date = pd.Timestamp(self._store.dates[-1])
+            self._date_index = self._store.date_index()
+            self._expiration_calendar = expiration_calendar(self._store.column('DataDate'),
+                                                            self._store.column('Expiration'))
+            return
+        self.frame = load_frame(fn, lambda: self._read_frame(fn, col_fns), tag, self.use_cache)
+        # Contract keys depend on per-process underlying ids, so they are never part of the cached frame.
+        self._index_by_contract_key(self.frame)
         self.start_date = self.frame['DataDate'].min()
         self.end_date = self.frame['DataDate'].max()
+        self._build_date_index()
+        self._expiration_calendar = expiration_calendar(self.frame['DataDate'].values, self.frame['Expiration'].values)
+
+    def _read_frame(self, fn, col_fns: dict = None):
+        """
+        Parse the raw CSV and prepare it: add derived columns and sort by DataDate.
+        :return: the prepared frame
+        """
+        self.frame = pd.read_csv(fn, **option_csv_options(self.columns, self.float_dtype))
+        if col_fns:
+            for name, f in col_fns.items():
+                self._add_column_to_frame(name, f)
+        # Within a day, rows are ordered for binary search by chain filters (see ChainDayIndex).
+        self.frame.sort_values(by=chain_sort_columns, kind='mergesort', inplace=True)
+        self.frame.reset_index(drop=True, inplace=True)
+        return self.frame
+
+    @staticmethod
+    def _index_by_contract_key(frame):
+        """
+        Replace the frame's index with the integer contract key of each row. The OptionSymbol column is kept for
+        display; lookups go through the key.
+        """
+        frame.index = pd.Index(contract_keys_from_frame(frame), name='ContractKey')
+
+    def _build_date_index(self):
+        """
+        Record the contiguous row range of every DataDate in the sorted frame so a day's chain can be sliced
+        by position instead of by scanning the whole history.
+        """
+        dates = self.frame['DataDate'].values
+        uniq, starts = np.unique(dates, return_index=True)
+        stops = np.append(starts[1:], len(dates))
+        self._date_index = {pd.Timestamp(d): (int(a), int(b)) for d, a, b in zip(uniq, starts, stops)}
 
     def _add_column_to_frame(self, name, f):
         """
         :param name: Name for the new column
-        :param f: Function to compute the new column given a row
+        :param f: Function to compute the new column given the frame (if @vectorized) or else given a row
         :return:
         """
-        self.frame[name] = self.frame.apply(lambda row: f(row), axis=1)
+        self.frame[name] = apply_column_function(self.frame, f)
 
     def _cache_chain(self, d):
         """
-        Extracts the current chain from the larger frame using a filter on the given date.
-        Sets the OptionSymbol (the OPRA code) as the index of this smaller frame.
-        Does not current check for errors like dupe indices, or failure to extract.
+        Extracts the current chain from the larger frame using the per-date row range built at load time.
+        The frame is already indexed by contract key, so the slice is a view that needs no re-index.
+        With a memory-mapped store, only that day's rows are read from disk.
+        Does not current check for errors like dupe indices.
         :param d: date for the single day's chain to cache.
         """
-        self.current = self.frame[self.frame['DataDate'] == d]
-        if self.current.empty:
+        rows = self._date_index.get(pd.Timestamp(d))
+        if rows is None:
             raise InvalidChainDate("Invalid date for option chain")
-        self.current.set_index('OptionSymbol', inplace=True)
+        self._day_index = None
+        self._expirations = self._expiration_calendar[pd.Timestamp(d)]
+        if self._store is not None:
+            self.current = self._store.frame(rows[0], rows[1])
+            self._index_by_contract_key(self.current)
+        else:
+            self.current = self.frame.iloc[rows[0]:rows[1]]
         return
-
-# This takes a set of column names and one or more values for the range comparison
-# i.e. Strike:(10,) means Strike>=10.  Delta:(.9, .99) means 0.9<=Delta<0.99
-# A programmatic way to apply all these filters at once! Make a function that correctly evals
-# the param predicate on a set of column values.
-# df = df[df[['col_1','col_2']].apply(lambda x: f(*x), axis=1)]
-# where f is a function that is applied to every pair of elements (x1, x2) from col_1 and col_2 and
-# returns True or False depending on any condition you want on (x1, x2).
-# def _filter_row(*x, params):
-#     # I'll use the dataframe.query for now
-#     return True
-#     def filter(self, params: list):
-#         """
-#         Locate the option matching the given column values, and then finding the one closest to the given
-#         underlying price
-#         :param params:
-#         :return:
-#         """
-#         # First, filter to strike price
-#         # diff_from_price = self.current.assign(DiffStrike = self.current["Strike"] - price)
-#         # diff_from_price.sort_values('DiffStrike', inplace=True)
-#         # return diff_from_price
-#         pass
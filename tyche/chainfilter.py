@@ -0,0 +1,237 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Option types are ordered call before put, as they sort in the chain.
+type_codes = {'C': 0, 'P': 1}
+
+
+def type_code(t):
+    """
+    :param t: 'call', 'put', 'C', 'P', in any case
+    :return: 0 for a call, 1 for a put
+    """
+    return type_codes[str(t)[0].upper()]
+
+
+class ChainDayIndex:
+
+    def __init__(self, frame: pd.DataFrame):
+        """
+        Search arrays for one day's chain, ordered by (Expiration, Type, Strike). The chain's frame is presorted that
+        way, so order is normally the identity and positions are rows of the frame as is.
+        Rows with the same expiration and type form a group whose strikes are sorted, so any strike range within a
+        group is one binary search.
+        :param frame: one day's chain
+        """
+        expiration = frame['Expiration'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        typ = (frame['Type'].astype(str).str[0].str.upper() == 'P').to_numpy(dtype=np.int8)
+        strike = frame['Strike'].to_numpy(dtype=np.float64)
+        if _is_sorted(expiration, typ, strike):
+            order = None
+        else:
+            order = np.lexsort((strike, typ, expiration))
+            expiration, typ, strike = expiration[order], typ[order], strike[order]
+        self.order = order  # sorted position -> frame row, None when the frame is already sorted
+        self.expiration = expiration
+        self.type = typ
+        self.strike = strike
+
+        change = np.flatnonzero((np.diff(expiration) != 0) | (np.diff(typ) != 0)) + 1
+        self.group_starts = np.concatenate(([0], change, [len(strike)])).astype(np.int64)
+        self.group_expiration = expiration[self.group_starts[:-1]]
+        self.group_type = typ[self.group_starts[:-1]]
+        self._delta_ladders = {}  # group -> (positions, deltas) sorted by delta
+
+    def group(self, expiration, typ):
+        """
+        :param expiration: expiration (int64 ns)
+        :param typ: type code
+        :return: the group of that expiration and type, or None if the day has no such contracts
+        """
+        a = np.searchsorted(self.group_expiration, expiration, 'left')
+        b = np.searchsorted(self.group_expiration, expiration, 'right')
+        for g in range(a, b):
+            if self.group_type[g] == typ:
+                return g
+        return None
+
+    def strike_ladder(self, g):
+        """
+        :param g: group
+        :return: (first sorted position of the group, its strikes in increasing order)
+        """
+        a, b = self.group_starts[g], self.group_starts[g + 1]
+        return a, self.strike[a:b]
+
+    def delta_ladder(self, g, delta):
+        """
+        The group's contracts ordered by delta. Built on first use per group.
+        :param g: group
+        :param delta: the day's Delta column, in frame row order
+        :return: (sorted positions of the group in delta order, their deltas in increasing order)
+        """
+        ladder = self._delta_ladders.get(g)
+        if ladder is None:
+            positions = np.arange(self.group_starts[g], self.group_starts[g + 1])
+            values = np.asarray(delta, dtype=np.float64)[self.rows(positions)]
+            order = np.argsort(values, kind='mergesort')
+            ladder = self._delta_ladders[g] = (positions[order], values[order])
+        return ladder
+
+    def rows(self, positions):
+        """
+        :param positions: sorted positions (array or slice)
+        :return: the frame rows at those positions
+        """
+        if self.order is None:
+            return positions
+        return self.order[positions]
+
+    def groups(self, expiration_lo=None, expiration_hi=None, types=None):
+        """
+        :param expiration_lo: lowest expiration (int64 ns) or None
+        :param expiration_hi: expiration (int64 ns) to stop before, or None
+        :param types: collection of type codes, or None for both
+        :return: array of group numbers in range, in sorted order
+        """
+        a = 0 if expiration_lo is None else np.searchsorted(self.group_expiration, expiration_lo, 'left')
+        b = len(self.group_expiration) if expiration_hi is None else \
+            np.searchsorted(self.group_expiration, expiration_hi, 'left')
+        groups = np.arange(a, b)
+        if types is not None:
+            groups = groups[np.isin(self.group_type[groups], list(types))]
+        return groups
+
+
+def _is_sorted(expiration, typ, strike):
+    """
+    :return: True if the rows are already in (expiration, type, strike) order, checked without sorting
+    """
+    d_exp = np.diff(expiration)
+    d_typ = np.diff(typ)
+    d_strike = np.diff(strike)
+    return bool(np.all((d_exp > 0) | ((d_exp == 0) & ((d_typ > 0) | ((d_typ == 0) & (d_strike >= 0))))))
+
+
+def nearest(values, target):
+    """
+    :param values: sorted array
+    :param target: value to look for
+    :return: index of the value closest to target (the lower one on a tie), or None if values is empty
+    """
+    if not len(values):
+        return None
+    i = np.searchsorted(values, target, 'left')
+    if i == len(values) or (i > 0 and target - values[i - 1] <= values[i] - target):
+        i -= 1
+    return int(i)
+
+
+class ChainFilter:
+
+    # Columns searched through the sorted order instead of by scanning.
+    indexed_columns = ('Expiration', 'Type', 'Strike')
+
+    def __init__(self, **ranges):
+        """
+        A compiled chain filter. Each keyword names a column and its range:
+            Strike=(10,) means Strike >= 10, Delta=(.9, .99) means 0.9 <= Delta < 0.99, (None, 0.3) is below 0.3.
+            Expiration takes dates the same way. Type takes 'call'/'put' (or 'C'/'P') or a list of them.
+        Expiration, Type and Strike are found by binary search on the day's sorted chain; any other numeric column
+        (Delta, IV, OpenInterest, ...) is then compared on just those rows.
+        Build it once (or use compile_filter) and apply it every day with Chain.filter.
+        """
+        self.ranges = {}
+        self.expiration = (None, None)
+        self.strike = (None, None)
+        self.types = None
+        for col, bounds in ranges.items():
+            if col == 'Type':
+                values = [bounds] if isinstance(bounds, str) else bounds
+                self.types = frozenset(type_code(t) for t in values)
+            elif col == 'Expiration':
+                lo, hi = self._bounds(bounds)
+                self.expiration = tuple(None if b is None else pd.Timestamp(b).value for b in (lo, hi))
+            elif col == 'Strike':
+                self.strike = self._bounds(bounds)
+            else:
+                self.ranges[col] = self._bounds(bounds)
+
+    @staticmethod
+    def _bounds(bounds):
+        """
+        :param bounds: (lo,) or (lo, hi); either may be None
+        :return: (lo, hi)
+        """
+        bounds = tuple(bounds)
+        if not 1 <= len(bounds) <= 2:
+            raise ValueError("A range is (lo,) or (lo, hi), got {}".format(bounds))
+        return bounds[0], bounds[1] if len(bounds) == 2 else None
+
+    def positions(self, index: ChainDayIndex, frame: pd.DataFrame):
+        """
+        :param index: ChainDayIndex of the day
+        :param frame: the day's chain
+        :return: positions of the matching rows in frame, a slice when they are contiguous
+        """
+        lo, hi = self.strike
+        starts = index.group_starts
+        ranges = []
+        for g in index.groups(self.expiration[0], self.expiration[1], self.types):
+            a, b = starts[g], starts[g + 1]
+            strikes = index.strike[a:b]
+            if lo is not None:
+                a, b = a + np.searchsorted(strikes, lo, 'left'), b
+                strikes = index.strike[a:b]
+            if hi is not None:
+                b = a + np.searchsorted(strikes, hi, 'left')
+            if a < b:
+                if ranges and ranges[-1][1] == a:
+                    ranges[-1][1] = b
+                else:
+                    ranges.append([a, b])
+
+        if len(ranges) == 1 and index.order is None:
+            positions = slice(int(ranges[0][0]), int(ranges[0][1]))
+        elif not ranges:
+            positions = slice(0, 0)
+        else:
+            positions = index.rows(np.concatenate([np.arange(a, b) for a, b in ranges]))
+
+        if self.ranges:
+            rows = np.arange(len(frame))[positions]
+            keep = np.ones(len(rows), dtype=bool)
+            for col, (c_lo, c_hi) in self.ranges.items():
+                values = frame[col].to_numpy()[rows]
+                if c_lo is not None:
+                    keep &= values >= c_lo
+                if c_hi is not None:
+                    keep &= values < c_hi
+            if not keep.all():
+                positions = rows[keep]
+        return positions
+
+
+# Most recently used compiled specs, oldest first. Bounded, since specs built around each day's prices are new daily.
+compiled_filters = 128
+_compiled = OrderedDict()
+
+
+def compile_filter(spec) -> ChainFilter:
+    """
+    :param spec: ChainFilter, or dict of column -> range as taken by ChainFilter
+    :return: the ChainFilter, compiled once per distinct spec while it is among the last compiled_filters used.
+             A strategy whose ranges change every day gains nothing from the cache; it can build a ChainFilter itself.
+    """
+    if isinstance(spec, ChainFilter):
+        return spec
+    key = tuple(sorted((col, repr(bounds)) for col, bounds in spec.items()))
+    f = _compiled.get(key)
+    if f is None:
+        f = _compiled[key] = ChainFilter(**spec)
+        if len(_compiled) > compiled_filters:
+            _compiled.popitem(last=False)
+    else:
+        _compiled.move_to_end(key)
+    return f
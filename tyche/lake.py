@@ -0,0 +1,169 @@
+import os
+import glob
+import shutil
+import numpy as np
+import pandas as pd
+from tyche.store import ColumnStore, meta_file
+from tyche.chain import Chain
+from tyche.quote import Quote
+
+# A data lake holds prepared histories partitioned by month of their date column:
+#   <root>/<SYMBOL>/<YYYY>/<MM>/<SYMBOL>_<kind>/   one ColumnStore per month, kind is 'chains' or 'quotes'
+chains_kind = 'chains'
+quotes_kind = 'quotes'
+
+
+def partition_path(root, symbol, kind, year, month):
+    return os.path.join(root, symbol, '{:04d}'.format(year), '{:02d}'.format(month), '{}_{}'.format(symbol, kind))
+
+
+def write_lake(frame: pd.DataFrame, root, symbol, kind, date_column):
+    """
+    Split a prepared history sorted by date_column into monthly ColumnStore partitions. Partitions of the same symbol
+    and kind that the frame no longer covers are removed.
+    :param frame: prepared frame, sorted by date_column
+    :param root: lake directory
+    :param symbol: Underlying symbol
+    :param kind: chains_kind or quotes_kind
+    :param date_column: DataDate or quotedate
+    :return: list of partition paths written
+    """
+    dates = pd.DatetimeIndex(frame[date_column])
+    months = dates.year.to_numpy() * 100 + dates.month.to_numpy()
+    uniq, starts = np.unique(months, return_index=True)
+    stops = np.append(starts[1:], len(months))
+    written = []
+    for ym, a, b in zip(uniq, starts, stops):
+        path = partition_path(root, symbol, kind, int(ym) // 100, int(ym) % 100)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ColumnStore.write(frame.iloc[a:b], path, date_column)
+        written.append(path)
+    for path in _partitions(root, symbol, kind):
+        if path not in written:
+            shutil.rmtree(path, ignore_errors=True)
+    return written
+
+
+def _partitions(root, symbol, kind, start=None, end=None):
+    """
+    :return: paths of the partitions holding months from start through end (all if None), in date order
+    """
+    first = None if start is None else pd.Timestamp(start).year * 100 + pd.Timestamp(start).month
+    last = None if end is None else pd.Timestamp(end).year * 100 + pd.Timestamp(end).month
+    pattern = os.path.join(glob.escape(os.path.join(root, symbol)), '[0-9]*', '[0-9]*', '{}_{}'.format(symbol, kind))
+    paths = []
+    for path in sorted(glob.glob(pattern)):
+        month_dir = os.path.dirname(path)
+        ym = int(os.path.basename(os.path.dirname(month_dir))) * 100 + int(os.path.basename(month_dir))
+        if (first is None or ym >= first) and (last is None or ym <= last) and \
+                os.path.exists(os.path.join(path, meta_file)):
+            paths.append(path)
+    return paths
+
+
+class LakeStore(ColumnStore):
+
+    def __init__(self, root, symbol, kind, start=None, end=None):
+        """
+        The rows of a lake history from start through end, read as one ColumnStore. Only the monthly partitions
+        overlapping the range are opened, and within the first and last of those only the rows in range are used,
+        so a short backtest reads a small fraction of a long history.
+        :param root: lake directory
+        :param symbol: Underlying symbol
+        :param kind: chains_kind or quotes_kind
+        :param start: first date to include, None for the beginning of the history
+        :param end: last date to include, None for the end of the history
+        :raises FileNotFoundError: the lake has no rows in the range
+        """
+        self.path = root
+        self._parts = []  # (ColumnStore, first row, last row + 1) of each partition, in date order
+        dates = []
+        offsets = [0]
+        for path in _partitions(root, symbol, kind, start, end):
+            store = ColumnStore(path)
+            a = 0 if start is None else int(np.searchsorted(store.dates, np.datetime64(pd.Timestamp(start), 'ns')))
+            b = len(store.dates) if end is None else \
+                int(np.searchsorted(store.dates, np.datetime64(pd.Timestamp(end), 'ns'), 'right'))
+            if a >= b:
+                continue
+            lo, hi = int(store.offsets[a]), int(store.offsets[b])
+            self._parts.append((store, lo, hi))
+            dates.append(store.dates[a:b])
+            offsets.extend(offsets[-1] + store.offsets[a + 1:b + 1] - lo)
+        if not self._parts:
+            raise FileNotFoundError("No {} {} data in {} from {} to {}".format(symbol, kind, root, start, end))
+        first = self._parts[0][0]
+        self.columns = first.columns
+        self.index_name = first.index_name
+        self.date_column = first.date_column
+        self._strings = first._strings
+        # Each month keeps its own categories; the range reads them against their union.
+        self._categories = {}
+        for col in first._categories:
+            categories = pd.Index(first._categories[col])
+            for store, lo, hi in self._parts[1:]:
+                categories = categories.append(pd.Index(store._categories[col]).difference(categories))
+            self._categories[col] = categories.to_numpy(dtype=str)
+        self.dates = np.concatenate(dates)
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+    def column(self, col):
+        """
+        :return: the column over the whole range (a copy, spliced from the partitions)
+        """
+        if col in self._categories:
+            return np.concatenate([self._codes(store, col, lo, hi) for store, lo, hi in self._parts])
+        return np.concatenate([store.column(col)[lo:hi] for store, lo, hi in self._parts])
+
+    def _codes(self, store, col, lo, hi):
+        """
+        :return: a partition's codes of a categorical column, as codes of the range's categories
+        """
+        codes = np.asarray(store.column(col)[lo:hi])
+        remap = pd.Index(self._categories[col]).get_indexer(store._categories[col])
+        return np.where(codes >= 0, remap[codes], -1).astype(codes.dtype)
+
+    def frame(self, start, stop, copy=True):
+        """
+        Materialize rows [start, stop) of the range, reading only the partitions they fall in.
+        """
+        pieces = []
+        base = 0
+        for store, lo, hi in self._parts:
+            n = hi - lo
+            a, b = max(start - base, 0), min(stop - base, n)
+            if a < b:
+                piece = store.frame(lo + a, lo + b, copy)
+                for col, categories in self._categories.items():
+                    if col in piece:
+                        piece[col] = piece[col].cat.set_categories(categories)
+                pieces.append(piece)
+            base += n
+            if base >= stop:
+                break
+        if len(pieces) == 1:
+            return pieces[0]
+        return pd.concat(pieces, ignore_index=self.index_name is None)
+
+
+def build_lake(chain: Chain, quote: Quote, root):
+    """
+    Write a loaded Chain and Quote into the lake. Chains are written without their contract key index, which depends
+    on per-process underlying ids.
+    """
+    write_lake(chain.frame.reset_index(drop=True), root, chain.symbol, chains_kind, 'DataDate')
+    write_lake(quote.frame, root, quote.symbol, quotes_kind, 'quotedate')
+
+
+def load_chain(symbol, root, start=None, end=None) -> Chain:
+    """
+    :return: Chain over the lake's option history from start through end
+    """
+    return Chain(symbol, store=LakeStore(root, symbol, chains_kind, start, end))
+
+
+def load_quote(symbol, root, start=None, end=None) -> Quote:
+    """
+    :return: Quote over the lake's quote history from start through end
+    """
+    return Quote(symbol, store=LakeStore(root, symbol, quotes_kind, start, end))
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from tyche.chain import Chain, InvalidChainDate
+from tyche.quote import Quote, InvalidQuoteDate
+from util import root_underlying
+
+
+def history_nbytes(chain: Chain = None, quote: Quote = None):
+    """
+    :return: approximate bytes held in memory by a loaded chain and quote, either of which may be None.
+             A memory-mapped or shared chain counts only its current day, since the OS pages the rest in and out.
+    """
+    nbytes = 0
+    if chain is not None:
+        frame = chain.frame if chain.frame is not None else chain.current
+        if frame is not None:
+            nbytes += int(frame.memory_usage(deep=True).sum())
+    if quote is not None:
+        if quote.frame is not None:
+            nbytes += int(quote.frame.memory_usage(deep=True).sum())
+        nbytes += sum(bars.nbytes for bars in quote._bars.values())
+    return nbytes
+
+
+class MarketData:
+
+    class Entry:
+
+        __slots__ = ('chain', 'quote', 'nbytes', 'pinned', 'chain_date', 'quote_date', 'has_chain', 'has_quote')
+
+        def __init__(self, chain: Chain = None, quote: Quote = None, pinned=False):
+            self.chain = chain
+            self.quote = quote
+            self.nbytes = history_nbytes(chain, quote)
+            self.pinned = pinned
+            self.chain_date = None  # date the chain was last set to
+            self.quote_date = None  # date the quote was last set to
+            self.has_chain = False  # the chain has rows on chain_date
+            self.has_quote = False  # the quote has a bar on quote_date
+
+    def __init__(self, memory_budget=None, option_path=None, quote_path=None, chain_loader=None,
+                 quote_loader=None):
+        """
+        The option chains and quote histories of every underlying in a backtest, keyed by symbol. Option roots such
+        as SPXW are looked up under their underlying (see util.root_underlying).
+        A symbol's quote and chain are each loaded the first time they are asked for (by a strategy, or by pricing an
+        open position) and moved to the current date only then, so an untouched symbol costs nothing and a stock-only
+        symbol never loads a chain. When the loaded histories exceed memory_budget, the least recently used symbols
+        are dropped; touching one again reloads it.
+        :param memory_budget: bytes of loaded histories to keep (see history_nbytes), None for no limit
+        :param option_path: Directory holding the option history CSV files, for the default chain_loader
+        :param quote_path: Directory holding the quote history CSV files, for the default quote_loader
+        :param chain_loader: function(symbol) -> Chain. Loads from option_path if None.
+        :param quote_loader: function(symbol) -> Quote. Loads from quote_path if None.
+        """
+        self.memory_budget = memory_budget
+        self._chain_loader = chain_loader if chain_loader else lambda symbol: Chain(symbol, option_path)
+        self._quote_loader = quote_loader if quote_loader else lambda symbol: Quote(symbol, quote_path)
+        self._entries = OrderedDict()  # symbol -> Entry, least recently used first
+        self._nbytes = 0
+        self._current_date = None
+
+    def add(self, symbol, chain: Chain, quote: Quote, pinned=True):
+        """
+        Register an already loaded chain and quote, e.g. a preloaded or shared history.
+        :param pinned: never evict it. Histories that the loaders cannot rebuild must be pinned.
+        """
+        self.remove(symbol)
+        entry = self._entries[symbol] = self.Entry(chain, quote, pinned)
+        self._nbytes += entry.nbytes
+        self._evict(symbol)
+
+    def remove(self, symbol):
+        entry = self._entries.pop(symbol, None)
+        if entry is not None:
+            self._nbytes -= entry.nbytes
+
+    def set_current_date(self, current_date):
+        """
+        Roll every symbol to current_date. Symbols catch up when they are next touched.
+        """
+        self._current_date = current_date
+
+    def chain(self, symbol, required=False) -> Chain:
+        """
+        :param required: raise when symbol has no chain on the current date, e.g. for the symbol driving the dates
+        :return: the option chain of symbol, loaded if needed and set to the current date, or None if it has no
+                 chain rows that day
+        :raises InvalidChainDate: required, and symbol has no chain on the current date
+        """
+        symbol = root_underlying(symbol)
+        entry = self._entry(symbol)
+        if entry.chain is None:
+            entry.chain = self._chain_loader(symbol)
+            self._resize(symbol, entry)
+        if self._current_date is not None and entry.chain_date != self._current_date:
+            try:
+                entry.chain.set_current_date(self._current_date)
+                entry.has_chain = True
+            except InvalidChainDate:
+                entry.has_chain = False
+            entry.chain_date = self._current_date
+            if entry.chain.frame is None:
+                # Only the current day of a memory-mapped chain is in memory, and it changes size daily.
+                self._resize(symbol, entry)
+        if self._current_date is not None and not entry.has_chain:
+            if required:
+                raise InvalidChainDate("No {} chain on {}".format(symbol, self._current_date))
+            return None
+        return entry.chain
+
+    def quote(self, symbol, required=False) -> Quote:
+        """
+        :param required: raise when symbol has no quote on the current date, e.g. for the symbol driving the dates
+        :return: the quote history of symbol, loaded if needed and set to the current date, or None if it has no
+                 quote that day
+        :raises InvalidQuoteDate: required, and symbol has no quote on the current date
+        """
+        symbol = root_underlying(symbol)
+        entry = self._entry(symbol)
+        if entry.quote is None:
+            entry.quote = self._quote_loader(symbol)
+            self._resize(symbol, entry)
+        if self._current_date is not None and entry.quote_date != self._current_date:
+            try:
+                entry.quote.set_current_date(self._current_date)
+                entry.has_quote = True
+            except InvalidQuoteDate:
+                entry.has_quote = False
+            entry.quote_date = self._current_date
+        if self._current_date is not None and not entry.has_quote:
+            if required:
+                raise InvalidQuoteDate("No {} quote on {}".format(symbol, self._current_date))
+            return None
+        return entry.quote
+
+    def symbols(self):
+        """
+        :return: the loaded symbols, least recently used first
+        """
+        return list(self._entries)
+
+    def memory_usage(self):
+        """
+        :return: bytes held by the loaded histories
+        """
+        return self._nbytes
+
+    def _entry(self, symbol):
+        """
+        :return: the symbol's Entry, now the most recently used, created empty if it is not loaded
+        """
+        entry = self._entries.get(symbol)
+        if entry is None:
+            entry = self._entries[symbol] = self.Entry()
+        else:
+            self._entries.move_to_end(symbol)
+        return entry
+
+    def _resize(self, symbol, entry):
+        """
+        Recount an entry whose histories were loaded or changed, then enforce the budget.
+        """
+        self._nbytes -= entry.nbytes
+        entry.nbytes = history_nbytes(entry.chain, entry.quote)
+        self._nbytes += entry.nbytes
+        self._evict(symbol)
+
+    def _evict(self, keep):
+        """
+        Drop least recently used, unpinned symbols other than keep until the budget is met.
+        """
+        if self.memory_budget is None:
+            return
+        for symbol in list(self._entries):
+            if self._nbytes <= self.memory_budget:
+                break
+            entry = self._entries[symbol]
+            if symbol != keep and not entry.pinned:
+                self.remove(symbol)
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Column name -> dtype of every field kept per lot. Dates are NaT when not set.
+order_fields = {
+    'key': np.int64,
+    'underlying': np.int32,
+    'instr_type': np.int8,
+    'quantity': np.int64,
+    'strike': np.float64,
+    'expiration': 'datetime64[ns]',
+    'entry_price': np.float64,
+    'current_price': np.float64,
+    'open_date': 'datetime64[ns]',
+    'close_date': 'datetime64[ns]',
+}
+
+
+def to_datetime64(d):
+    """
+    :param d: date, datetime, Timestamp or None
+    :return: numpy datetime64[ns], NaT for None
+    """
+    if d is None:
+        return np.datetime64('NaT', 'ns')
+    return pd.Timestamp(d).to_datetime64()
+
+
+def from_datetime64(d):
+    """
+    :param d: numpy datetime64
+    :return: Timestamp, or None for NaT
+    """
+    if np.isnat(d):
+        return None
+    return pd.Timestamp(d)
+
+
+class OrderBook:
+
+    def __init__(self, capacity=64):
+        """
+        Struct-of-arrays storage for every lot (order) a Portfolio has held, open or closed. Each field is a typed
+        NumPy array, grown by doubling, and a lot is identified by its row. Rows are never removed, so a row stays
+        valid for the life of the book.
+        :param capacity: initial number of rows allocated
+        """
+        self._size = 0
+        for name, dtype in order_fields.items():
+            setattr(self, name, self._empty(dtype, capacity))
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _empty(dtype, capacity):
+        if np.dtype(dtype).kind == 'M':
+            return np.full(capacity, np.datetime64('NaT', 'ns'))
+        return np.zeros(capacity, dtype=dtype)
+
+    def _grow(self):
+        capacity = 2 * len(self.key)
+        for name, dtype in order_fields.items():
+            old = getattr(self, name)
+            new = self._empty(dtype, capacity)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def append(self, key, underlying, instr_type, quantity, strike, expiration, entry_price, current_price,
+               open_date, close_date=None):
+        """
+        Add a lot.
+        :return: row of the new lot
+        """
+        if self._size == len(self.key):
+            self._grow()
+        row = self._size
+        self.key[row] = key
+        self.underlying[row] = underlying
+        self.instr_type[row] = instr_type
+        self.quantity[row] = quantity
+        self.strike[row] = strike
+        self.expiration[row] = to_datetime64(expiration)
+        self.entry_price[row] = entry_price
+        self.current_price[row] = current_price
+        self.open_date[row] = to_datetime64(open_date)
+        self.close_date[row] = to_datetime64(close_date)
+        self._size += 1
+        return row
+
+    def profit_loss(self, rows):
+        """
+        Vectorized Position.current_pl over a set of lots.
+        :param rows: array of rows
+        :return: array of P/L, options counted as 100 shares per contract
+        """
+        multiplier = np.where(self.instr_type[rows] != 0, 100.0, 1.0)
+        return self.quantity[rows] * (self.current_price[rows] - self.entry_price[rows]) * multiplier
+
+    def value(self, rows):
+        """
+        Vectorized Position.current_value over a set of lots.
+        :param rows: array of rows
+        :return: array of current values
+        """
+        multiplier = np.where(self.instr_type[rows] != 0, 100.0, 1.0)
+        return self.quantity[rows] * self.current_price[rows] * multiplier
@@ -1,12 +1,17 @@
 from typing import List
-from math import copysign
+from math import copysign, isclose
+from collections import deque
+from itertools import chain as chain_iter
+import heapq
+import numpy as np
 import datetime as dt
-from util import opra_code
+from util import contract_key, opra_code_from_key, underlying_id, underlying_symbol, key_types, key_type_letters
 # import sys
 # sys.path.append("..")
 from tyche.position import Position
-from tyche.chain import Chain
 from tyche.quote import Quote
+from tyche.market import MarketData
+from tyche.orderbook import OrderBook, to_datetime64, from_datetime64
 
 
 # Reminder: The user does not have access to this class inside the simulator so price is correctly managed by the
@@ -15,21 +20,56 @@ class Portfolio:
 
     class Order(Position):
 
-        def __init__(self, quantity, underlying, instrument_type, strike,
-                     expiration: dt.datetime, unit_price, open_date: dt.datetime):
+        __slots__ = ('_book', '_row')
+
+        def __init__(self, book: OrderBook, row):
             """
-            Init internal structure for holding an order transaction in the portfolio
-            :param quantity: number of options in the transaction
-            :param underlying: underlying stock or the stock itself
-            :param instrument_type: C or P or S (we will only keep the first letter of what is given)
-            :param strike: Strike price of the option or initial Share price for a stock
-            :param expiration: Obvious. Unused for stocks.
-            :param unit_price: Current price. Since this is internal to the Simulation, we assume price is correct
-            :param open_date: Date of the simulation order was executed.
+            A lightweight view of one lot (an order transaction) stored in the Portfolio's OrderBook. Reads the lot's
+            fields from the book, so it stays current as the book is updated.
+            :param book: the OrderBook holding the lot
+            :param row: row of the lot in the book
             """
-            super().__init__(quantity, underlying, instrument_type, strike, expiration, unit_price)
-            self.open_date = open_date
-            self.close_date = None
+            self._book = book
+            self._row = row
+
+        @property
+        def quantity(self):
+            return int(self._book.quantity[self._row])
+
+        @property
+        def underlying(self):
+            return underlying_symbol(int(self._book.underlying[self._row]))
+
+        @property
+        def instr_type(self):
+            return key_type_letters[self._book.instr_type[self._row]]
+
+        @property
+        def strike(self):
+            return float(self._book.strike[self._row])
+
+        @property
+        def expiration(self):
+            return from_datetime64(self._book.expiration[self._row])
+
+        @property
+        def entry_price(self):
+            return float(self._book.entry_price[self._row])
+
+        @property
+        def current_price(self):
+            return float(self._book.current_price[self._row])
+
+        @property
+        def open_date(self):
+            return from_datetime64(self._book.open_date[self._row])
+
+        @property
+        def close_date(self):
+            return from_datetime64(self._book.close_date[self._row])
+
+        def contract_key(self):
+            return int(self._book.key[self._row])
 
         def __str__(self):
             t = "Order: {} x {} @ ${} / ${}".format(self.opra_code(), self.quantity,
@@ -37,7 +77,7 @@ class Portfolio:
             return t
 
         def mark_closed(self, current_date):
-            self.close_date = current_date
+            self._book.close_date[self._row] = to_datetime64(current_date)
 
         def set_current_price(self, chain, quote):
             """
@@ -47,10 +87,10 @@ class Portfolio:
             :return:
             """
             if self.is_option():
-                price = chain.get_current_price(self.opra_code(), self.quantity)
+                price = chain.get_current_price(self.contract_key(), self.quantity)
             else:
                 price = quote.get_current_price()
-            self.current_price = price
+            self._book.current_price[self._row] = price
 
         def gen_position(self) -> Position:
             p = Position(self.quantity, self.underlying, self.instr_type,
@@ -81,17 +121,24 @@ class Portfolio:
                 return p
             return None
 
-    def __init__(self):
-        self._orders = {}  # dict of order lists keyed by OPRA
-        self._closed_orders = {}  # same, but have close dates
-        self._closed_pl = 0.0
+    def __init__(self, debug=False):
+        """
+        :param debug: Cross-check the running realized P/L against a full recompute on every update_prices.
+        """
+        self._debug = debug
+        self._book = OrderBook()  # every lot, open or closed
+        self._orders = {}  # FIFO queue (deque) of open lot rows keyed by contract key, oldest first
+        self._expirations = []  # min-heap of the expiration dates in _expiring
+        self._expiring = {}  # expiration -> contract keys (as an ordered dict) that have open orders expiring then
+        self._closed_orders = {}  # same, but lists of closed lot rows
+        self._closed_pl = 0.0  # realized P/L, accumulated as orders are closed
         self._open_pl = 0.0
         self._liquid = 0.0
 
     def __str__(self):
         lines = []
-        for oc, pp in self._orders.items():
-            x = oc + ": " + str(pp)
+        for oc, lots in self._orders.items():
+            x = opra_code_from_key(oc) + ": " + ", ".join(str(self.Order(self._book, row)) for row in lots)
             lines.append(x)
         return "\n".join(lines)
 
@@ -103,7 +150,7 @@ class Portfolio:
         That is, if we are long in X with M options, and we get an order for +N, then we add an order to the open
         orders set.
         However, if we are long (short) in X with M options, and we get an order for -N (+N), then we are closing part
-        or all of the current position.
+        or all of the current position. Lots are closed first in, first out.
         If abs(N) == abs(M), then simply close the order (set close date, price, etc.) then move to closed orders.
         If abs(N) < abs(M), then we have only closed part of it. Clone X to make Y.  Reduce X quantity by M and leave
         it alone. Set Y to closed and update the closed parameters -> Set quantity to -M, with the opposite sign, to
@@ -124,85 +171,139 @@ class Portfolio:
         :return: number of units unordered (only non-zero if reconcile_only is true)
         """
 
-        oc = opra_code(underlying, expiration, strike, instrument_type)
+        oc = contract_key(underlying, expiration, strike, instrument_type)
+        lot = (underlying, instrument_type, strike, expiration, unit_price, exec_date)
         if oc not in self._orders:
             if not reconcile_only:
-                # Haven't seen this opra before? Great. Start a new Order list for it.
-                p = self.Order(count, underlying, instrument_type, strike, expiration, unit_price, exec_date)
-                self._orders[oc] = [p]
+                # Haven't seen this opra before? Great. Start a new lot queue for it.
+                self._open_lot(oc, count, *lot)
         else:
-            # Orders exist for this OC. Close them from front to back.
-            # Compare to the first order in the current list. All orders in the list are the same - long or short.
-            pp: List = self._orders[oc]
-            while pp and count != 0:
-                p = pp.pop()
-                new_sign = copysign(1, count)
-                cur_sign = copysign(1, p.quantity)
-
-                if new_sign == cur_sign:
-                    # We are extending the current position with a new Order. Put pp back to front of the list,
-                    pp.insert(0, p)
-                    # And add the new one to the end.
-                    p = self.Order(count, underlying, instrument_type, strike, expiration, unit_price, exec_date)
-                    self._orders[oc].append(p)
+            # Orders exist for this OC. Close them from the oldest.
+            # All lots in the queue are the same - long or short.
+            lots: deque = self._orders[oc]
+            book = self._book
+            while lots and count != 0:
+                row = lots[0]
+                quantity = int(book.quantity[row])
+
+                if copysign(1, count) == copysign(1, quantity):
+                    # We are extending the current position with a new lot at the back of the queue.
+                    self._open_lot(oc, count, *lot)
                     count = 0
                 else:
-                    # We are closing part or all of the current position p
-                    if abs(count) >= abs(p.quantity):
+                    # We are closing part or all of the current position
+                    if abs(count) >= abs(quantity):
                         # Complete closed this one.
-                        p.mark_closed(exec_date)
-                        self._add_closed_orders(oc, [p])
+                        lots.popleft()
+                        book.close_date[row] = to_datetime64(exec_date)
+                        self._add_closed_orders(oc, [row])
                         # reduce current quantity by the closed quantity (add since signs differ).
-                        count += p.quantity
+                        count += quantity
 
                     else:
-                        # Partially close this one. Adjust quantity and push it back onto the front.
-                        p.quantity += count
-                        self._orders[oc].insert(0, p)
+                        # Partially close this one. Adjust quantity and leave it at the front.
+                        book.quantity[row] = quantity + count
                         # And add a closed order with the current count.
-                        p = self.Order(count, underlying, instrument_type, strike, expiration, unit_price, exec_date)
-                        p.mark_closed(exec_date)  # Definitely need to set the P/L
-                        self._add_closed_orders(oc, [p])
+                        closed = self._append_lot(count, *lot, close_date=exec_date)
+                        self._add_closed_orders(oc, [closed])
                         count = 0
 
             # If count!=0, then the active orders should be empty as we closed them all.
             # Create a new order and put in the actives.
             if count != 0 and not reconcile_only:
-                p = self.Order(count, underlying, instrument_type, strike, expiration, unit_price, exec_date)
-                self._orders[oc].append(p)
+                self._open_lot(oc, count, *lot)
                 count = 0
 
         return count
 
-    def update_prices(self, chain: Chain, quote: Quote):
+    def _append_lot(self, count, underlying, instrument_type, strike, expiration, unit_price, exec_date,
+                    close_date=None):
+        """
+        Add a lot to the book, priced at unit_price.
+        :return: row of the lot
+        """
+        typ = key_types[instrument_type[0].upper()]
+        return self._book.append(contract_key(underlying, expiration, strike, instrument_type),
+                                 underlying_id(underlying), typ, count, strike, expiration, unit_price, unit_price,
+                                 exec_date, close_date)
+
+    def _open_lot(self, oc, count, *lot):
+        """
+        Add an open lot to the back of the contract's queue.
+        """
+        row = self._append_lot(count, *lot)
+        if oc not in self._orders:
+            self._orders[oc] = deque()
+        self._orders[oc].append(row)
+        self._index_expiration(oc, row)
+
+    def _open_rows(self):
+        return np.fromiter(chain_iter.from_iterable(self._orders.values()), dtype=np.int64)
+
+    def update_prices(self, chain, quote: Quote = None):
         """
         This is where the money gets counted.
-        For each open order, update its current profit and loss using the day's option chain.
+        Update the current price of every open order from the day's option chain in one batch.
         Note that PL does deduct entry cost, so on minute 0, PL is 0 (theoretically).
         Add total open current_pl to get the equity balance
         Add total closed current_pl to get the pl balance
         The broker will compute net_liquid and available balance with these.
-        :param chain: the current day's option chain
-        :param quote: the current day's stock quote
+        :param chain: the current day's option chain, or a MarketData to price each order from the chain and quote of
+                      its own underlying
+        :param quote: the current day's stock quote. Omitted with a MarketData.
         :return: equity balance from open orders, cash balance from closed orders
         :rtype: (double, double)
         """
-        self._open_pl = 0.0
-        self._liquid = 0.0
-        # Total the open orders, setting current_pl as we go
-        for oc, pp in self._orders.items():
-            p: Portfolio.Order
-            for p in pp:
-                p.set_current_price(chain, quote)
-                self._open_pl += p.current_pl()
-                self._liquid += p.current_value()
-        # Total the closed orders again because I am not yet confident the sum can be cached and updated correctly :-)
-        self._closed_pl = 0.0
-        for oc, pp in self._closed_orders.items():
-            for p in pp:
-                self._closed_pl += p.current_pl()
+        # Mark every open lot in one pass: look all option prices up at once, then total with array arithmetic.
+        book = self._book
+        rows = self._open_rows()
+        if isinstance(chain, MarketData):
+            market = chain
+            uids = book.underlying[rows]
+            price = np.zeros(len(rows))
+            for uid in np.unique(uids):
+                mask = uids == uid
+                symbol = underlying_symbol(int(uid))
+                price[mask] = self._current_prices(rows[mask], lambda: market.chain(symbol),
+                                                   lambda: market.quote(symbol))
+        else:
+            price = self._current_prices(rows, lambda: chain, lambda: quote)
+        book.current_price[rows] = price
+        self._open_pl = float(np.sum(book.profit_loss(rows)))
+        self._liquid = float(np.sum(book.value(rows)))
+        if self._debug:
+            closed_pl = self._recompute_closed_pl()
+            assert isclose(closed_pl, self._closed_pl, rel_tol=1e-9, abs_tol=1e-6), \
+                "Realized P/L drifted: running {} vs recomputed {}".format(self._closed_pl, closed_pl)
         return self._open_pl, self._closed_pl, self._liquid
 
+    def _current_prices(self, rows, chain, quote):
+        """
+        :param rows: open lots of one underlying
+        :param chain: function returning its option chain, only called if there are options to price. When it returns
+                      None (no chain rows today), the options keep their last price.
+        :param quote: function returning its stock quote, only called if there is stock to price. When it returns
+                      None (no quote today), the stock keeps its last price.
+        :return: array of current prices of the lots
+        """
+        book = self._book
+        is_option = book.instr_type[rows] != 0
+        price = np.zeros(len(rows))
+        if is_option.any():
+            option_rows = rows[is_option]
+            option_chain = chain()
+            if option_chain is None:
+                price[is_option] = book.current_price[option_rows]
+            else:
+                price[is_option] = option_chain.get_current_prices(book.key[option_rows], book.quantity[option_rows])
+        if not is_option.all():
+            stock_quote = quote()
+            if stock_quote is None:
+                price[~is_option] = book.current_price[rows[~is_option]]
+            else:
+                price[~is_option] = stock_quote.get_current_price()
+        return price
+
     def gen_statement(self) -> List[Position]:
         """
         Create a read-only view of the open Positions for the Strategy to peruse.
@@ -210,58 +311,89 @@ class Portfolio:
         :rtype: List[Position]
         """
         flat: List[Position] = []
-        for oc, pp in self._orders.items():
-            p = self.Order.gen_merged_position(pp)
+        for oc, lots in self._orders.items():
+            p = self.Order.gen_merged_position([self.Order(self._book, row) for row in lots])
             if p:
                 flat.append(p)
         return flat
 
     def expire_positions(self, current_date):
         """
-        Check each position to see if this is the expiration date.
+        Find the positions whose expiration is on or before this date, using the expiration buckets so only the
+        contracts actually expiring are visited.
         If it has expired, move it to closed and add it to the return list
         :param current_date:
         :return:
         """
         expiry: List[Portfolio.Order] = []
+        book = self._book
+        d = to_datetime64(current_date)
 
-        # iterate over a separate copy of the keys to avoid modifying the dict during iteration
-        ocs = list(self._orders.keys())
-        for oc in ocs:
-            pp = self._orders[oc]
+        while self._expirations and self._expirations[0] <= current_date:
+            expiration = heapq.heappop(self._expirations)
+            for oc in self._expiring.pop(expiration):
+                # Orders may have been closed since they were bucketed.
+                lots = self._orders.get(oc)
+                if not lots:
+                    continue
 
-            # Does this oc have expiring options?
-            ex = [p for p in pp if p.expiration and p.expiration <= current_date]
-            if ex:
-                # First, add these to the return list
-                expiry.extend(ex)
+                # Does this oc have expiring options? (NaT, i.e. no expiration, never compares as expired)
+                ex = [row for row in lots if book.expiration[row] <= d]
+                if ex:
+                    # First, add these to the return list and mark them closed
+                    expiry.extend(self.Order(book, row) for row in ex)
+                    book.close_date[ex] = d
 
-                # Second, remove them from the original list for that oc
-                self._orders[oc] = [p for p in pp if not (p.expiration and p.expiration <= current_date)]
+                    # Second, remove them from the original queue for that oc
+                    self._orders[oc] = deque(row for row in lots if not book.expiration[row] <= d)
 
-                # Speed up loops by removing empty lists
-                if not self._orders[oc]:
-                    del self._orders[oc]
+                    # Speed up loops by removing empty lists
+                    if not self._orders[oc]:
+                        del self._orders[oc]
 
-                # Add them to the closed order list
-                self._add_closed_orders(oc, ex)
+                    # Add them to the closed order list
+                    self._add_closed_orders(oc, ex)
 
-        # Mark them closed and return the final list
-        map(lambda p: p.mark_closed(current_date), expiry)
         return expiry
 
+    def _index_expiration(self, oc, row):
+        """
+        Record that the contract has an open lot expiring on the lot's expiration date.
+        :param oc: contract key of the lot
+        :param row: row of the newly opened lot
+        """
+        expiration = from_datetime64(self._book.expiration[row])
+        if expiration is None:
+            return
+        bucket = self._expiring.get(expiration)
+        if bucket is None:
+            bucket = self._expiring[expiration] = {}
+            heapq.heappush(self._expirations, expiration)
+        bucket[oc] = None
+
     def current_open_pl(self):
         return self._open_pl
 
     def current_value(self):
         return self._liquid
 
-    def _add_closed_orders(self, closing_opra_code, closing_orders):
+    def current_closed_pl(self):
+        return self._closed_pl
+
+    def _recompute_closed_pl(self):
+        """
+        Total realized P/L by summing every closed order. Only used to verify the running total in debug mode.
+        """
+        rows = np.fromiter(chain_iter.from_iterable(self._closed_orders.values()), dtype=np.int64)
+        return float(np.sum(self._book.profit_loss(rows)))
+
+    def _add_closed_orders(self, closing_key, closing_rows):
         """
-        :param closing_opra_code: Must be the code for all of the given orders to be added to the closed list
-        :param closing_orders: list of orders
-        :ptype pp: list of Order
+        :param closing_key: Must be the contract key for all of the given lots to be added to the closed list
+        :param closing_rows: list of lot rows
         """
-        if closing_opra_code not in self._closed_orders:
-            self._closed_orders[closing_opra_code] = []
-        self._closed_orders[closing_opra_code].extend(closing_orders)
+        if closing_key not in self._closed_orders:
+            self._closed_orders[closing_key] = []
+        self._closed_orders[closing_key].extend(closing_rows)
+        # Closed lots are never re-priced, so their P/L can be realized once, here.
+        self._closed_pl += float(np.sum(self._book.profit_loss(np.asarray(closing_rows, dtype=np.int64))))
@@ -1,9 +1,12 @@
 import datetime as dt
-from util import opra_code
+from util import opra_code, contract_key
 
 
 class Position:
 
+    __slots__ = ('quantity', 'underlying', 'instr_type', 'strike', 'expiration', 'entry_price', 'current_price',
+                 '_contract_key')
+
     def __init__(self, quantity, underlying, instrument_type, strike=0.0, expiration: dt.datetime=None,
                  entry_price=None, current_price=None):
         """
@@ -25,6 +28,7 @@ class Position:
         self.expiration = expiration
         self.entry_price = entry_price if entry_price else 0.0
         self.current_price = current_price if current_price else self.entry_price
+        self._contract_key = None
 
     def __str__(self):
         if self.instr_type[0] == 'S':
@@ -41,6 +45,15 @@ class Position:
             t = opra_code(self.underlying, self.expiration, self.strike, self.instr_type)
         return t
 
+    def contract_key(self):
+        """
+        Integer identity of the contract (see util.contract_key), computed once. Used for lookups in place of
+        opra_code(), which is for display.
+        """
+        if self._contract_key is None:
+            self._contract_key = contract_key(self.underlying, self.expiration, self.strike, self.instr_type)
+        return self._contract_key
+
     def is_option(self):
         return self.instr_type[0] != 'S'
 
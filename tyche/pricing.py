@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+# Black-Scholes-Merton pricing over whole columns. Every function takes arrays (or scalars) that broadcast together:
+#   s: underlying price, k: strike, t: years to expiration, sigma: volatility, is_call: bool,
+#   r: risk-free rate, q: dividend yield, both continuously compounded.
+# Units: theta is per calendar year, vega per 1.00 of volatility (divide by 365 and 100 for per day and per point).
+
+days_per_year = 365.0
+_sqrt_2pi = np.sqrt(2.0 * np.pi)
+
+
+def _pdf(x):
+    return np.exp(-0.5 * x * x) / _sqrt_2pi
+
+
+def years_to_expiration(expiration, data_date):
+    """
+    :param expiration: Expiration column (datetime64)
+    :param data_date: DataDate column (datetime64)
+    :return: float array of calendar days between them / 365, never negative
+    """
+    days = (np.asarray(expiration, dtype='datetime64[ns]') - np.asarray(data_date, dtype='datetime64[ns]')) / \
+        np.timedelta64(1, 'D')
+    return np.maximum(days, 0.0) / days_per_year
+
+
+def _d1_d2(s, k, t, sigma, r, q):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol = sigma * np.sqrt(t)
+        d1 = (np.log(s / k) + (r - q + 0.5 * sigma * sigma) * t) / vol
+    return d1, d1 - vol
+
+
+def price(s, k, t, sigma, is_call, r=0.0, q=0.0):
+    """
+    :return: option value; intrinsic value at expiration or with zero volatility
+    """
+    s, k, t, sigma, is_call = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (s, k, t, sigma)),
+                                                  np.asarray(is_call, dtype=bool))
+    d1, d2 = _d1_d2(s, k, t, sigma, r, q)
+    fs = s * np.exp(-q * t)
+    fk = k * np.exp(-r * t)
+    call = fs * ndtr(d1) - fk * ndtr(d2)
+    put = fk * ndtr(-d2) - fs * ndtr(-d1)
+    value = np.where(is_call, call, put)
+    degenerate = (t <= 0) | (sigma <= 0)
+    if degenerate.any():
+        intrinsic = np.where(is_call, np.maximum(fs - fk, 0.0), np.maximum(fk - fs, 0.0))
+        value = np.where(degenerate, intrinsic, value)
+    return value
+
+
+def greeks(s, k, t, sigma, is_call, r=0.0, q=0.0):
+    """
+    :return: dict of delta, gamma, theta, vega arrays. At expiration delta is 1/-1 in the money and 0 otherwise,
+             and the rest are 0.
+    """
+    s, k, t, sigma, is_call = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (s, k, t, sigma)),
+                                                  np.asarray(is_call, dtype=bool))
+    d1, d2 = _d1_d2(s, k, t, sigma, r, q)
+    sqrt_t = np.sqrt(t)
+    eq = np.exp(-q * t)
+    er = np.exp(-r * t)
+    pdf = _pdf(d1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(is_call, eq * ndtr(d1), -eq * ndtr(-d1))
+        gamma = eq * pdf / (s * sigma * sqrt_t)
+        vega = s * eq * pdf * sqrt_t
+        common = -s * eq * pdf * sigma / (2 * sqrt_t)
+        theta = np.where(is_call,
+                         common - r * k * er * ndtr(d2) + q * s * eq * ndtr(d1),
+                         common + r * k * er * ndtr(-d2) - q * s * eq * ndtr(-d1))
+
+    degenerate = (t <= 0) | (sigma <= 0)
+    if degenerate.any():
+        itm = np.where(is_call, s * eq > k * er, s * eq < k * er)
+        delta = np.where(degenerate, np.where(itm, np.where(is_call, 1.0, -1.0), 0.0), delta)
+        gamma = np.where(degenerate, 0.0, gamma)
+        vega = np.where(degenerate, 0.0, vega)
+        theta = np.where(degenerate, 0.0, theta)
+    return {'delta': delta, 'gamma': gamma, 'theta': theta, 'vega': vega}
+
+
+def prob_itm(s, k, t, atm_iv, is_call):
+    """
+    Whole-column util._prob_itm: the chance an out of the money option finishes in the money, from a driftless
+    lognormal at the ATM volatility. In the money options are 1.0; with no time or volatility, 0.0.
+    """
+    s, k, t, atm_iv, is_call = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (s, k, t, atm_iv)),
+                                                   np.asarray(is_call, dtype=bool))
+    denom = atm_iv * np.sqrt(t)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.log(k / s) / denom
+    otm_put = ~is_call & (k <= s)
+    otm_call = is_call & (k > s)
+    p = np.where(otm_put, ndtr(z), np.where(otm_call, 1.0 - ndtr(z), 1.0))
+    return np.where(denom > 0, p, 0.0)
+
+
+def implied_vol(value, s, k, t, is_call, r=0.0, q=0.0, tol=1e-8, max_iter=100, lo=1e-4, hi=5.0):
+    """
+    Batched implied volatility: Newton steps on every row at once, kept inside a shrinking bisection bracket so rows
+    where Newton misbehaves (deep in or out of the money, tiny vega) still converge.
+    :param value: option prices
+    :param lo: lowest volatility considered
+    :param hi: highest volatility considered
+    :return: volatility array; NaN where the price is outside what [lo, hi] can produce (e.g. below intrinsic)
+    """
+    value, s, k, t, is_call = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (value, s, k, t)),
+                                                  np.asarray(is_call, dtype=bool))
+    shape = value.shape
+    value, s, k, t, is_call = value.ravel(), s.ravel(), k.ravel(), t.ravel(), is_call.ravel()
+
+    low = np.full(value.shape, lo)
+    high = np.full(value.shape, hi)
+    solvable = (t > 0) & (price(s, k, t, low, is_call, r, q) <= value) & \
+        (value <= price(s, k, t, high, is_call, r, q))
+    sigma = np.full(value.shape, 0.3)
+    active = solvable.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        i = np.flatnonzero(active)
+        v = price(s[i], k[i], t[i], sigma[i], is_call[i], r, q)
+        diff = v - value[i]
+        done = np.abs(diff) < tol
+        # Keep the bracket around the root: price increases with volatility.
+        high[i] = np.where(diff > 0, sigma[i], high[i])
+        low[i] = np.where(diff < 0, sigma[i], low[i])
+        vega = greeks(s[i], k[i], t[i], sigma[i], is_call[i], r, q)['vega']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = sigma[i] - diff / vega
+        bisect = ~np.isfinite(step) | (step <= low[i]) | (step >= high[i])
+        sigma[i] = np.where(done, sigma[i], np.where(bisect, 0.5 * (low[i] + high[i]), step))
+        active[i] = ~done & (high[i] - low[i] > tol)
+    return np.where(solvable, sigma, np.nan).reshape(shape)
+
+
+def chain_greeks(frame: pd.DataFrame, r=0.0, q=0.0, price_column=None):
+    """
+    Recompute IV and greeks for a whole chain (a day, or an entire history) from its quotes.
+    :param frame: option frame with UnderlyingPrice, Strike, Type, Expiration, DataDate and Bid/Ask
+    :param price_column: column to solve IV from; the Bid/Ask midpoint if None
+    :return: DataFrame indexed like frame with IV, Delta, Gamma, Theta, Vega
+    """
+    s = frame['UnderlyingPrice'].to_numpy(dtype=float)
+    k = frame['Strike'].to_numpy(dtype=float)
+    t = years_to_expiration(frame['Expiration'], frame['DataDate'])
+    is_call = frame['Type'].astype(str).str[0].str.upper().to_numpy() == 'C'
+    if price_column:
+        value = frame[price_column].to_numpy(dtype=float)
+    else:
+        value = 0.5 * (frame['Bid'].to_numpy(dtype=float) + frame['Ask'].to_numpy(dtype=float))
+    iv = implied_vol(value, s, k, t, is_call, r, q)
+    g = greeks(s, k, t, iv, is_call, r, q)
+    return pd.DataFrame({'IV': iv, 'Delta': g['delta'], 'Gamma': g['gamma'], 'Theta': g['theta'],
+                         'Vega': g['vega']}, index=frame.index)
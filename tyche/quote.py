@@ -1,4 +1,7 @@
+import numpy as np
 import pandas as pd
+from util import apply_column_function
+from tyche.cache import load_frame, column_tag
 
 option_path = '../option_history/'
 quote_path = '../quote_history/'
@@ -7,7 +10,8 @@ quote_path = '../quote_history/'
 # (index) | symbol | quotedate | open | high   | low   | close | volume  | adjustedclose
 # 3571    | TEAM   | 8/1/2018  | 72.5 | 74.555 | 72.41 | 73.29 | 1358735 | 73.29
 
-column_functions = {}  # name:fn(row) such as 'ADX':adx_for_row(row)
+column_functions = {}  # name:fn(row) such as 'ADX':adx_for_row(row), or a @vectorized fn(frame)
+bar_columns = ['open', 'high', 'low', 'close', 'volume']
 
 
 class InvalidQuoteDate(Exception):
@@ -16,10 +20,14 @@ class InvalidQuoteDate(Exception):
 
 class Quote:
 
-    def __init__(self, symbol, path=None):
+    def __init__(self, symbol, path=None, use_cache=True, store=None):
         """
         An option chain collection defined by a symbol. Loads the CSV file from the option_history directory.
         :param symbol: Underlying symbol.
+        :param path: Directory holding the quote history CSV files.
+        :param use_cache: Load from (and save to) the binary cache of the prepared frame next to the CSV.
+        :param store: An open ColumnStore of the prepared history (e.g. tyche.shared.attach_quote) to read instead
+                      of the CSV. The frame's numeric columns are then views of the store.
         """
         self.frame = None
         self.current = None
@@ -28,6 +36,11 @@ class Quote:
         self.end_date = None
         self.symbol = symbol
         self.quote_path = path if path else quote_path
+        self.use_cache = use_cache
+        self._store = store
+        self._bars = {}  # column name -> contiguous numpy array of the sorted frame
+        self._date_index = {}  # quotedate -> row offset into the bar arrays
+        self._offset = None
         self._cache_frame(col_fns=column_functions)
 
     def set_current_date(self, current_date):
@@ -46,44 +59,106 @@ class Quote:
     def date_range(self):
         return self.start_date, self.end_date
 
+    def trading_dates(self):
+        """
+        :return: every quotedate with a quote, in order
+        :rtype: pd.DatetimeIndex
+        """
+        return pd.DatetimeIndex(sorted(self._date_index))
+
     def query_quotes(self, query):
         tmp = self.current.query(query)
         return tmp
 
+    def get_by_opra(self, symbol):
+        """
+        Mirror of Chain.get_by_opra for a stock: the OPRA code of a stock is just its symbol.
+        :param symbol: Symbol of this quote history.
+        :return: the current day's quote row
+        """
+        return self.current.iloc[0]
+
+    def get_current_bar(self):
+        """
+        :return: open, high, low, close, volume for the current date
+        :rtype: (float, float, float, float, float)
+        """
+        i = self._offset
+        return tuple(self._bars[col][i] for col in bar_columns)
+
     def get_current_price(self):
-        row = self.current.iloc[0]
-        return row['close']
+        return self._bars['close'][self._offset]
+
+    def bars(self, dates):
+        """
+        Whole-history version of get_current_bar.
+        :param dates: quotedates to return, e.g. TradingCalendar.dates
+        :return: dict of open, high, low, close, volume -> array aligned with dates
+        :raises InvalidQuoteDate: a date has no quote
+        """
+        try:
+            rows = np.array([self._date_index[pd.Timestamp(d)] for d in dates], dtype=np.int64)
+        except KeyError as e:
+            raise InvalidQuoteDate(str(e))
+        return {col: self._bars[col][rows] for col in bar_columns}
 
     def _cache_frame(self, col_fns: dict = None):
         """
         Load the entire option history file for the given symbol into memory.
         Optionally, apply any columns to the frame
         Slice out the current date chain.
+        The prepared frame is cached on disk, so only the first load parses CSV.
+        """
+        if self._store is not None:
+            self.frame = self._store.frame(0, len(self._store), copy=False)
+        else:
+            fn = self.quote_path + self.symbol + '.csv'
+            self.frame = load_frame(fn, lambda: self._read_frame(fn, col_fns), column_tag(col_fns), self.use_cache)
+        self.start_date = self.frame['quotedate'].min()
+        self.end_date = self.frame['quotedate'].max()
+        self._build_bars()
+
+    def _read_frame(self, fn, col_fns: dict = None):
+        """
+        Parse the raw CSV and prepare it: add derived columns and sort by quotedate.
+        :return: the prepared frame
         """
-        fn = self.quote_path + self.symbol + '.csv'
         quote_date_cols = ['quotedate']
         self.frame = pd.read_csv(fn, parse_dates=quote_date_cols)
         if col_fns:
-            for name, fn in col_fns.items():
-                self._add_column_to_frame(name, fn)
-        self.frame.sort_values(by='quotedate', inplace=True)
-        self.start_date = self.frame['quotedate'].min()
-        self.end_date = self.frame['quotedate'].max()
+            for name, f in col_fns.items():
+                self._add_column_to_frame(name, f)
+        self.frame.sort_values(by='quotedate', kind='mergesort', inplace=True)
+        self.frame.reset_index(drop=True, inplace=True)
+        return self.frame
+
+    def _build_bars(self):
+        """
+        Copy the OHLCV columns into contiguous arrays and map each quotedate to its row, so the daily price lookups
+        are plain array indexing rather than pandas row access.
+        """
+        self._bars = {col: np.ascontiguousarray(self.frame[col].to_numpy(dtype=np.float64)) for col in bar_columns}
+        uniq, starts = np.unique(self.frame['quotedate'].values, return_index=True)
+        self._date_index = {pd.Timestamp(d): int(i) for d, i in zip(uniq, starts)}
 
     def _add_column_to_frame(self, name, f):
         """
         :param name: Name for the new column
-        :param f: Function to compute the new column given a row
+        :param f: Function to compute the new column given the frame (if @vectorized) or else given a row
         :return:
         """
-        self.frame[name] = self.frame.apply(lambda row: f(row), axis=1)
+        self.frame[name] = apply_column_function(self.frame, f)
 
     def _cache_quote(self, d):
         """
-        Extracts the current chain from the larger frame using a filter on the given date.
-        Does not current check for errors.
+        Extracts the current quote from the larger frame using the date offset built at load time.
+        An unknown date leaves an empty current frame.
         :param d: date for the chain to cache.
         """
-        self.current = self.frame[self.frame['quotedate'] == d]
+        self._offset = self._date_index.get(pd.Timestamp(d))
+        if self._offset is None:
+            self.current = self.frame.iloc[0:0]
+        else:
+            self.current = self.frame.iloc[self._offset:self._offset + 1]
         return
 
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from tyche.store import ColumnStore, column_arrays
+from tyche.chain import Chain
+from tyche.quote import Quote
+
+
+class SharedHistory:
+
+    def __init__(self, frame: pd.DataFrame, date_column):
+        """
+        Owner of one copy of a prepared history frame in shared memory, one block per column in the same layout as a
+        ColumnStore. Hand self.handle (small and picklable) to worker processes, which call attach() to read the
+        data in place. The owner must outlive the workers and close() the blocks when they are done.
+        :param frame: prepared frame, sorted by date_column
+        :param date_column: name of the date column the rows are grouped by
+        """
+        meta, arrays, dates, offsets, categories = column_arrays(frame, date_column)
+        self._blocks = []
+        self.handle = {'meta': meta,
+                       'columns': [self._share(values) for values in arrays],
+                       'categories': categories,
+                       'dates': self._share(dates),
+                       'offsets': self._share(offsets)}
+
+    def _share(self, values: np.ndarray):
+        """
+        Copy an array into a new shared memory block.
+        :return: (block name, dtype string, shape) to find it again
+        """
+        # Zero-size blocks are not allowed.
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        self._blocks.append(block)
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+        return block.name, values.dtype.str, values.shape
+
+    def close(self):
+        """
+        Release and remove the shared blocks. Workers still attached keep their mapping until they exit.
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SharedColumnStore(ColumnStore):
+
+    def __init__(self, handle):
+        """
+        A ColumnStore whose columns are read-only views of the shared memory blocks published by a SharedHistory.
+        Nothing is copied on attach; rows are only read when a frame is materialized.
+        :param handle: SharedHistory.handle
+        """
+        meta = handle['meta']
+        self.path = None
+        self.columns = meta['columns']
+        self.index_name = meta['index']
+        self.date_column = meta['date_column']
+        self._strings = set(meta['strings'])
+        self._categories = handle['categories']
+        self._blocks = []
+        self._arrays = {col: self._attach(spec) for col, spec in zip(self.columns, handle['columns'])}
+        self.dates = self._attach(handle['dates'])
+        self.offsets = self._attach(handle['offsets'])
+
+    def _attach(self, spec):
+        name, dtype, shape = spec
+        # Worker processes share their parent's resource tracker, so attaching does not hand the block to a tracker
+        # that would unlink it when the worker exits.
+        block = shared_memory.SharedMemory(name=name)
+        self._blocks.append(block)
+        values = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        values.flags.writeable = False
+        return values
+
+    def frame(self, start, stop, copy=False):
+        """
+        As ColumnStore.frame, but numeric and date columns are views of shared memory unless copy is set.
+        """
+        return super().frame(start, stop, copy)
+
+
+def share_chain(chain: Chain) -> SharedHistory:
+    """
+    Publish a loaded Chain's history in shared memory.
+    Contract keys depend on per-process underlying ids, so the frame is shared without its index and each worker's
+    Chain re-keys the rows it reads.
+    :param chain: Chain loaded without memory_map
+    :return: SharedHistory; pass its handle to attach_chain
+    """
+    return SharedHistory(chain.frame.reset_index(drop=True), 'DataDate')
+
+
+def share_quote(quote: Quote) -> SharedHistory:
+    """
+    Publish a loaded Quote's history in shared memory.
+    :return: SharedHistory; pass its handle to attach_quote
+    """
+    return SharedHistory(quote.frame, 'quotedate')
+
+
+def attach_chain(symbol, handle) -> Chain:
+    """
+    :param symbol: Underlying symbol
+    :param handle: SharedHistory.handle from share_chain
+    :return: Chain reading the shared history in place
+    """
+    return Chain(symbol, store=SharedColumnStore(handle))
+
+
+def attach_quote(symbol, handle) -> Quote:
+    """
+    :param symbol: Symbol of the quote history
+    :param handle: SharedHistory.handle from share_quote
+    :return: Quote reading the shared history in place
+    """
+    return Quote(symbol, store=SharedColumnStore(handle))
@@ -0,0 +1,188 @@
+import os
+import glob
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from tyche.cache import cache_dir, source_key, tag_key
+
+# File names inside a store directory. Columns are saved as c<position>.npy, names are kept in the meta file.
+# Categorical columns are saved as their codes, with the categories in c<position>.categories.npy.
+dates_file = '_dates.npy'
+offsets_file = '_offsets.npy'
+meta_file = '_meta.json'
+
+
+class ColumnStore:
+
+    def __init__(self, path):
+        """
+        A read-only, column-per-file copy of a prepared history frame sorted by date. Every column is a NumPy array
+        memory-mapped from disk, so only the pages of the rows actually read are brought into memory, and processes
+        reading the same store share the OS page cache.
+        :param path: Directory written by ColumnStore.write
+        """
+        self.path = path
+        with open(os.path.join(path, meta_file)) as fh:
+            meta = json.load(fh)
+        self.columns = meta['columns']
+        self.index_name = meta['index']
+        self.date_column = meta['date_column']
+        self._strings = set(meta['strings'])
+        self._arrays = {col: np.load(_column_fn(path, i), mmap_mode='r') for i, col in enumerate(self.columns)}
+        self._categories = {col: np.load(_categories_fn(path, i)) for i, col in enumerate(self.columns)
+                            if col in meta['categoricals']}
+        self.dates = np.load(os.path.join(path, dates_file))
+        self.offsets = np.load(os.path.join(path, offsets_file))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def date_index(self):
+        """
+        :return: dict of date -> (first row, last row + 1)
+        """
+        return {pd.Timestamp(d): (int(a), int(b)) for d, a, b in zip(self.dates, self.offsets[:-1], self.offsets[1:])}
+
+    def column(self, col):
+        """
+        :param col: column name
+        :return: the memory-mapped array for a column (strings are stored as fixed-width bytes, categoricals as their
+                 codes)
+        """
+        return self._arrays[col]
+
+    def frame(self, start, stop, copy=True):
+        """
+        Materialize rows [start, stop) as a DataFrame. Only those rows are paged in from disk.
+        :param copy: False to leave the numeric and date columns as read-only views of the store
+        :return: pandas DataFrame indexed like the frame the store was written from
+        """
+        data = {}
+        for col in self.columns:
+            values = self._arrays[col][start:stop]
+            if col in self._strings:
+                values = values.astype(str)
+            elif col in self._categories:
+                values = pd.Categorical.from_codes(np.array(values), categories=self._categories[col])
+            elif copy:
+                values = np.array(values)
+            data[col] = values
+        frame = pd.DataFrame(data, columns=self.columns, copy=False)
+        if self.index_name:
+            frame.set_index(self.index_name, inplace=True)
+        return frame
+
+    @staticmethod
+    def write(frame: pd.DataFrame, path, date_column, replace=True):
+        """
+        Write a frame already sorted by date_column as a store directory. Written to a temporary directory first
+        and then renamed into place so readers never see a partial store. An existing store is renamed aside before
+        it is removed. If another process publishes the same path while this one is writing, its store is kept and
+        this copy is discarded.
+        :param frame: prepared frame, sorted by date_column
+        :param path: store directory to create
+        :param date_column: name of the date column the rows are grouped by
+        :param replace: False to keep a store already at path (e.g. built meanwhile by another process) and discard
+                        this copy
+        """
+        meta, arrays, dates, offsets, categories = column_arrays(frame, date_column)
+        tmp_path = path + '.{}.tmp'.format(os.getpid())
+        os.makedirs(tmp_path, exist_ok=True)
+        for i, (col, values) in enumerate(zip(meta['columns'], arrays)):
+            np.save(_column_fn(tmp_path, i), values)
+            if col in categories:
+                np.save(_categories_fn(tmp_path, i), categories[col])
+        np.save(os.path.join(tmp_path, dates_file), dates)
+        np.save(os.path.join(tmp_path, offsets_file), offsets)
+        with open(os.path.join(tmp_path, meta_file), 'w') as fh:
+            json.dump(meta, fh)
+
+        old_path = None
+        if os.path.exists(path) and not replace:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        if os.path.exists(path):
+            old_path = path + '.{}.old'.format(os.getpid())
+            try:
+                os.replace(path, old_path)
+            except FileNotFoundError:
+                old_path = None
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another process published a store here first.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        if old_path:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+
+def column_arrays(frame: pd.DataFrame, date_column):
+    """
+    Flatten a frame sorted by date_column into the plain arrays a store is made of.
+    Strings become fixed-width byte arrays, dates datetime64[ns], and categoricals of strings their codes.
+    :param frame: prepared frame, sorted by date_column
+    :param date_column: name of the date column the rows are grouped by
+    :return: (meta dict, list of column arrays, array of unique dates, array of row offsets of each date plus the end,
+              dict of categorical column -> array of its categories)
+    """
+    index_name = frame.index.name
+    if index_name:
+        frame = frame.reset_index()
+    strings = []
+    categories = {}
+    arrays = []
+    for col in frame.columns:
+        series = frame[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = series.to_numpy(dtype='datetime64[ns]')
+        elif isinstance(series.dtype, pd.CategoricalDtype) and \
+                series.cat.categories.inferred_type in ('string', 'empty'):
+            values = series.cat.codes.to_numpy()
+            categories[str(col)] = series.cat.categories.to_numpy(dtype=str)
+        elif pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+            values = series.to_numpy()
+        else:
+            values = series.astype(object).where(series.notna(), '').astype(str).to_numpy()
+            try:
+                values = values.astype('S')
+            except UnicodeEncodeError:
+                values = values.astype('U')
+            strings.append(col)
+        arrays.append(np.ascontiguousarray(values))
+
+    dates = frame[date_column].to_numpy(dtype='datetime64[ns]')
+    uniq, starts = np.unique(dates, return_index=True)
+    offsets = np.append(starts, len(dates)).astype(np.int64)
+    meta = {'columns': [str(c) for c in frame.columns], 'index': index_name, 'date_column': date_column,
+            'strings': strings, 'categoricals': list(categories)}
+    return meta, arrays, uniq, offsets, categories
+
+
+def _column_fn(path, i):
+    return os.path.join(path, 'c{}.npy'.format(i))
+
+
+def _categories_fn(path, i):
+    return os.path.join(path, 'c{}.categories.npy'.format(i))
+
+
+def open_store(fn, load, date_column, tag=''):
+    """
+    Open the column store for a raw CSV file, building it from load() if it is missing or the CSV has changed.
+    Stale stores for the same file and tag are removed.
+    :param fn: Path of the raw CSV file
+    :param load: callable returning the prepared frame, sorted by date_column. Only called to build the store.
+    :param date_column: name of the date column
+    :param tag: see tyche.cache.FrameCache
+    :return: ColumnStore
+    """
+    base = os.path.basename(fn)
+    prefix = os.path.join(os.path.dirname(fn), cache_dir, '{}.{}.'.format(base, tag_key(tag)))
+    path = prefix + source_key(fn, tag) + '.cols'
+    if not os.path.exists(os.path.join(path, meta_file)):
+        ColumnStore.write(load(), path, date_column, replace=False)
+        for old_path in glob.glob(glob.escape(prefix) + '*.cols'):
+            if old_path != path:
+                shutil.rmtree(old_path, ignore_errors=True)
+    return ColumnStore(path)
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+from tyche.chain import Chain, InvalidChainDate, chain_sort_columns, expiration_calendar
+from tyche.quote import Quote, InvalidQuoteDate
+
+
+class EndOfHistory(Exception):
+    """
+    Raised by a streaming Chain or Quote when asked for a date past the last day in the stream.
+    Deliberately not an InvalidChainDate/InvalidQuoteDate so the Broker does not keep skipping forward.
+    """
+    pass
+
+
+class UnsortedHistory(Exception):
+    pass
+
+
+def iter_csv_days(fn, date_column, chunksize=200000, **options):
+    """
+    Read a history CSV that is sorted by date in chunks and yield one day at a time.
+    A day split across chunks is carried over and yielded whole.
+    :param fn: Path of the CSV file
+    :param date_column: Column the file is sorted by
+    :param chunksize: Rows per read
+    :param options: Extra pandas.read_csv keyword arguments (parse_dates must include date_column)
+    :return: generator of (date, frame for that date)
+    """
+    carry = None
+    last = None
+    for chunk in pd.read_csv(fn, chunksize=chunksize, **options):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        dates = chunk[date_column].values
+        if (dates[1:] < dates[:-1]).any() or (last is not None and dates[0] < last):
+            raise UnsortedHistory("{} is not sorted by {}".format(fn, date_column))
+        last = dates[-1]
+        # Everything before the last date in the chunk is complete.
+        uniq, starts = np.unique(dates, return_index=True)
+        stops = np.append(starts[1:], len(dates))
+        for d, a, b in zip(uniq[:-1], starts[:-1], stops[:-1]):
+            yield pd.Timestamp(d), chunk.iloc[a:b]
+        carry = chunk.iloc[starts[-1]:]
+    if carry is not None and len(carry):
+        yield pd.Timestamp(carry[date_column].iloc[0]), carry
+
+
+class DayStream:
+
+    def __init__(self, days):
+        """
+        Forward-only cursor over a (date, frame) generator, holding at most the next day in memory.
+        :param days: iterable of (date, frame) in increasing date order
+        """
+        self._days = iter(days)
+        self._next = None
+        self._advance()
+
+    def _advance(self):
+        try:
+            self._next = next(self._days)
+        except StopIteration:
+            self._next = None
+
+    def peek_date(self):
+        """
+        :return: date of the next day in the stream, or None if it is exhausted
+        """
+        return self._next[0] if self._next is not None else None
+
+    def seek(self, d):
+        """
+        Skip forward to the given date and consume it.
+        :param d: date to move to
+        :return: frame for that date, or None if the stream has no such date
+        """
+        d = pd.Timestamp(d)
+        while self._next is not None and self._next[0] < d:
+            self._advance()
+        if self._next is None:
+            raise EndOfHistory()
+        if self._next[0] != d:
+            return None
+        day = self._next[1]
+        self._advance()
+        return day
+
+
+class StreamingChain(Chain):
+
+    def __init__(self, symbol, days):
+        """
+        A Chain fed one day at a time from a generator, typically Adapter.iter_option_days. Dates can only move
+        forward, and only the current and next day are held in memory. end_date is unknown until the stream ends.
+        :param symbol: Underlying symbol.
+        :param days: iterable of (DataDate, frame) in increasing date order
+        """
+        self._stream = DayStream(days)
+        super().__init__(symbol)
+
+    def _cache_frame(self, col_fns: dict = None):
+        self._col_fns = col_fns
+        self.start_date = self._stream.peek_date()
+
+    def has_next(self):
+        return self._stream.peek_date() is not None
+
+    def set_current_date(self, current_date):
+        """
+        Move the chain forward to the given date.
+        :raises InvalidChainDate: the stream has no chain for that date (or it is before the current one)
+        :raises EndOfHistory: the stream is exhausted
+        """
+        if self.cur_date is not None and current_date <= self.cur_date:
+            if current_date == self.cur_date:
+                return
+            raise InvalidChainDate()
+        self._cache_chain(current_date)
+        self.cur_date = current_date
+
+    def _cache_chain(self, d):
+        day = self._stream.seek(d)
+        if day is None or day.empty:
+            raise InvalidChainDate("Invalid date for option chain")
+        self.frame = day.sort_values(by=chain_sort_columns[1:], kind='mergesort')
+        if self._col_fns:
+            for name, f in self._col_fns.items():
+                self._add_column_to_frame(name, f)
+        self._index_by_contract_key(self.frame)
+        self._day_index = None
+        self._expirations = expiration_calendar(self.frame['DataDate'].values,
+                                                self.frame['Expiration'].values)[pd.Timestamp(d)]
+        self.current = self.frame
+        self.frame = None
+        self.end_date = self.current['DataDate'].iloc[0]
+
+
+class StreamingQuote(Quote):
+
+    def __init__(self, symbol, days):
+        """
+        A Quote fed one day at a time from a generator, typically Adapter.iter_quote_days. Dates only move forward.
+        :param symbol: Symbol of the quote history.
+        :param days: iterable of (quotedate, frame) in increasing date order
+        """
+        self._stream = DayStream(days)
+        super().__init__(symbol)
+
+    def _cache_frame(self, col_fns: dict = None):
+        self._col_fns = col_fns
+        self.start_date = self._stream.peek_date()
+
+    def has_next(self):
+        return self._stream.peek_date() is not None
+
+    def set_current_date(self, current_date):
+        """
+        Move the quote forward to the given date.
+        :raises InvalidQuoteDate: the stream has no quote for that date (or it is before the current one)
+        :raises EndOfHistory: the stream is exhausted
+        """
+        if self.cur_date is not None and current_date <= self.cur_date:
+            if current_date == self.cur_date:
+                return
+            raise InvalidQuoteDate()
+        self._cache_quote(current_date)
+        self.cur_date = current_date
+
+    def _cache_quote(self, d):
+        day = self._stream.seek(d)
+        if day is None or day.empty:
+            raise InvalidQuoteDate()
+        self.frame = day.reset_index(drop=True)
+        if self._col_fns:
+            for name, f in self._col_fns.items():
+                self._add_column_to_frame(name, f)
+        self._build_bars()
+        self._offset = 0
+        self.current = self.frame.iloc[0:1]
+        self.end_date = self.frame['quotedate'].iloc[0]
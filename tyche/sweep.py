@@ -0,0 +1,159 @@
+import os
+import time
+import itertools
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tyche import backtest
+from tyche.backtest import Backtest
+from tyche.calendar import TradingCalendar
+from tyche.chain import Chain
+from tyche.quote import Quote
+from tyche.shared import share_chain, share_quote, attach_chain, attach_quote
+
+# Per worker process: the last symbol's (symbol, chain, quote, calendar), reused by consecutive runs on that symbol,
+# and the shared memory handles of each symbol's histories when the sweep published them.
+_history = None
+_shared_handles = {}
+
+
+class SweepRun:
+
+    def __init__(self, symbol, strategy_cls, starting_balance, strategy_args=None):
+        """
+        One Backtest in a parameter sweep. Must be picklable, so strategy_cls has to be importable at module level.
+        :param symbol: Underlying symbol to backtest
+        :param strategy_cls: Strategy class
+        :param starting_balance: Initial cash balance
+        :param strategy_args: dict of keyword arguments for strategy_cls
+        """
+        self.symbol = symbol
+        self.strategy_cls = strategy_cls
+        self.starting_balance = starting_balance
+        self.strategy_args = strategy_args or {}
+
+    def __str__(self):
+        args = ", ".join("{}={}".format(k, v) for k, v in self.strategy_args.items())
+        return "{} {}({}) ${:.2f}".format(self.symbol, self.strategy_cls.__name__, args, self.starting_balance)
+
+
+class SweepResult:
+
+    def __init__(self, run: SweepRun, net_liquid=None, error=None, elapsed=0.0):
+        """
+        Outcome of one SweepRun.
+        :param run: the run
+        :param net_liquid: net liquid value at the end of the backtest, None if it failed
+        :param error: formatted traceback if the backtest raised, else None
+        :param elapsed: wall-clock seconds the backtest took in its worker
+        """
+        self.run = run
+        self.net_liquid = net_liquid
+        self.error = error
+        self.elapsed = elapsed
+
+    def ok(self):
+        return self.error is None
+
+    def __str__(self):
+        if self.ok():
+            return "{}: net-liquid ${:.2f} ({:.1f}s)".format(self.run, self.net_liquid, self.elapsed)
+        return "{}: FAILED\n{}".format(self.run, self.error)
+
+
+def sweep_grid(symbols, strategy_cls, starting_balances, param_grid: dict = None):
+    """
+    Every combination of symbol x strategy parameters x starting balance.
+    Runs are ordered by symbol so that runs sharing a history tend to land in the same worker's page cache.
+    :param symbols: list of underlying symbols
+    :param strategy_cls: Strategy class
+    :param starting_balances: list of initial cash balances
+    :param param_grid: dict of strategy keyword argument -> list of values to try
+    :return: list of SweepRun
+    """
+    param_grid = param_grid or {}
+    names = list(param_grid)
+    runs = []
+    for symbol in symbols:
+        for values in itertools.product(*(param_grid[name] for name in names)):
+            for balance in starting_balances:
+                runs.append(SweepRun(symbol, strategy_cls, balance, dict(zip(names, values))))
+    return runs
+
+
+def _set_shared_handles(handles):
+    global _shared_handles
+    _shared_handles = handles
+
+
+def _load_history(symbol):
+    """
+    :return: chain, quote and calendar for the symbol, kept from the previous run when it was the same symbol
+    """
+    global _history
+    if _history is None or _history[0] != symbol:
+        _history = None  # Let the previous symbol go before loading the next.
+        if symbol in _shared_handles:
+            chain_handle, quote_handle = _shared_handles[symbol]
+            chain, quote = attach_chain(symbol, chain_handle), attach_quote(symbol, quote_handle)
+        else:
+            chain, quote = Chain(symbol, backtest.option_path), Quote(symbol, backtest.quote_path)
+        _history = (symbol, chain, quote, TradingCalendar(chain, quote))
+    return _history[1:]
+
+
+def execute_run(run: SweepRun) -> SweepResult:
+    """
+    Run one Backtest, quietly. Any exception is caught and returned in the result so one bad run does not stop the
+    sweep.
+    """
+    start = time.perf_counter()
+    try:
+        chain, quote, calendar = _load_history(run.symbol)
+        bt = Backtest(run.symbol, run.strategy_cls, run.starting_balance, strategy_args=run.strategy_args,
+                      verbose=False, chain=chain, quote=quote, calendar=calendar)
+        net_liquid = bt.run()
+    except Exception:
+        return SweepResult(run, error=traceback.format_exc(), elapsed=time.perf_counter() - start)
+    return SweepResult(run, net_liquid=net_liquid, elapsed=time.perf_counter() - start)
+
+
+def run_sweep(runs, workers=None, shared=False):
+    """
+    Fan the runs out over a pool of worker processes and yield each result as soon as its run finishes, so results
+    arrive in completion order, not submission order. Every worker is a separate process, so runs do not contend on
+    the GIL and throughput grows with the number of cores. A worker keeps its last symbol's histories loaded, so
+    consecutive runs on one symbol load it once.
+    :param runs: list of SweepRun
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param shared: Load every symbol once in this process and publish it in shared memory (see tyche.shared) for
+                   the workers to attach, instead of each worker loading its own copy.
+    :return: generator of SweepResult, one per run
+    """
+    workers = workers or os.cpu_count() or 1
+    published = []
+    handles = {}
+    try:
+        if shared:
+            for symbol in dict.fromkeys(run.symbol for run in runs):
+                try:
+                    chain, quote = Chain(symbol, backtest.option_path), Quote(symbol, backtest.quote_path)
+                except Exception:
+                    # Left for the workers to load, and report, themselves.
+                    continue
+                published += [share_chain(chain), share_quote(quote)]
+                handles[symbol] = (published[-2].handle, published[-1].handle)
+                del chain, quote
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_shared_handles,
+                                 initargs=(handles,)) as pool:
+            futures = {pool.submit(execute_run, run): run for run in runs}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception:
+                    # The worker died outright (BrokenProcessPool, e.g. killed for memory) or the result could not
+                    # be sent back. Report the run as failed and keep going.
+                    yield SweepResult(futures[future], error=traceback.format_exc())
+    finally:
+        for history in published:
+            history.close()
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from tyche.quote import Quote
+
+
+class NotVectorizable(Exception):
+    """
+    The strategy has no target_positions, so it can only run through the daily event loop.
+    """
+    pass
+
+
+class OrderRejected(Exception):
+    """
+    The Broker would have rejected one of the fills, after which the event loop's history diverges from the targets.
+    """
+    pass
+
+
+class VectorizedResult:
+
+    def __init__(self, dates, shares, fills, cash, equity, high_balance, low_balance):
+        """
+        Outcome of a whole-history run. Arrays are aligned with dates.
+        :param dates: trading dates
+        :param shares: shares held at the end of each day
+        :param fills: shares bought (+) or sold (-) at each day's close
+        :param cash: cash balance at the end of each day
+        :param equity: net liquid at the end of each day, as Broker.net_liquid reports it
+        :param high_balance: highest end-of-day cash balance, starting balance included
+        :param low_balance: lowest end-of-day cash balance, starting balance included
+        """
+        self.dates = dates
+        self.shares = shares
+        self.fills = fills
+        self.cash = cash
+        self.equity = equity
+        self.high_balance = high_balance
+        self.low_balance = low_balance
+
+    def net_liquid(self):
+        return float(self.equity[-1])
+
+
+def run_vectorized(quote: Quote, dates: pd.DatetimeIndex, targets, starting_balance, margin_multiple=0.3):
+    """
+    Execute a stock-only strategy over the whole history at once, reproducing the Broker's daily event loop:
+    every fill happens at the day's close, costs come out of cash in date order, and positions are valued as of
+    the day's open mark (before that day's fills) exactly as Broker.net_liquid does.
+    :param quote: quote history of the underlying
+    :param dates: trading dates of the backtest
+    :param targets: shares to hold at the end of each date, aligned with dates
+    :param starting_balance: initial cash balance
+    :param margin_multiple: as Broker
+    :return: VectorizedResult
+    :raises OrderRejected: the Broker would have rejected a fill for lack of cash or option buying power
+    """
+    close = quote.bars(dates)['close']
+    shares = np.asarray(targets, dtype=np.int64)
+    held = np.concatenate(([0], shares[:-1]))  # shares held going into each day
+    fills = shares - held
+    costs = fills * close
+
+    # Subtract day by day, in order, so the floating point cash balance is identical to the event loop's.
+    cash = np.subtract.accumulate(np.concatenate(([starting_balance], costs)))
+    cash_before, cash = cash[:-1], cash[1:]
+
+    # The Broker's two checks in place_order: cash for the cost, then covering for any sale.
+    traded = fills != 0
+    cover_power = np.where(held > 0, held * close, 0.0) + (cash_before - costs) / margin_multiple
+    rejected = traded & ((costs > cash_before) | (-fills * close > cover_power))
+    if rejected.any():
+        raise OrderRejected("Order on {} would be rejected".format(dates[np.argmax(rejected)].date()))
+
+    equity = held * close + cash
+    high_balance = max(starting_balance, float(cash.max())) if len(cash) else starting_balance
+    low_balance = min(starting_balance, float(cash.min())) if len(cash) else starting_balance
+    return VectorizedResult(dates, shares, fills, cash, equity, high_balance, low_balance)
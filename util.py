@@ -1,11 +1,36 @@
+import os
 import re
 import math
 import datetime as dt
+import numpy as np
 import pandas as pd
 from scipy.stats import norm
+from tyche.pricing import prob_itm, years_to_expiration
 
 
 option_path = '../option_history/'
+quote_path = '../quote_history/'
+
+
+def vectorized(f):
+    """
+    Marks a column function as taking the whole frame and returning the entire column (Series or ndarray) at once,
+    instead of being called once per row. Chain and Quote use the row-wise form only for unmarked functions.
+    """
+    f.vectorized = True
+    return f
+
+
+def apply_column_function(frame, f):
+    """
+    Compute a derived column from a frame using either protocol of column function.
+    :param frame: pandas DataFrame
+    :param f: a @vectorized f(frame) or a row-wise f(row)
+    :return: the new column values
+    """
+    if getattr(f, 'vectorized', False):
+        return f(frame)
+    return frame.apply(lambda row: f(row), axis=1)
 
 
 def opra_code(symbol: str, expiration: dt.datetime, strike, opt_type: str):
@@ -26,10 +51,127 @@ def opra_code(symbol: str, expiration: dt.datetime, strike, opt_type: str):
         opra = "{}{:02d}{:02d}{:02d}{}{:08d}".format(symbol,
                                                      expiration.year-2000, expiration.month, expiration.day,
                                                      opt_type[0],
-                                                     int(strike*1000))
+                                                     int(round(strike*1000)))
     return opra
 
 
+# Contract keys pack a contract into one int64 so it can be used as a fast integer index:
+#   bits 45-62 root id (the OPRA root, e.g. SPXW, which is the underlying symbol for most options) | bits 29-44 expiration (days since 2000-01-01) | bits 27-28 type | bits 0-26 strike * 1000
+# Underlying ids are assigned per process as symbols are first seen, so keys must not be persisted.
+key_epoch = dt.datetime(2000, 1, 1)
+key_types = {'S': 0, 'C': 1, 'P': 2}
+key_type_letters = 'SCP'
+_underlying_ids = {}
+_underlying_symbols = [None]
+_root_underlyings = {}  # OPRA root -> underlying symbol, for roots that differ from their underlying (SPXW -> SPX)
+
+
+def underlying_id(symbol: str):
+    """
+    :param symbol: underlying symbol
+    :return: small integer id for the symbol, assigned on first use
+    """
+    uid = _underlying_ids.get(symbol)
+    if uid is None:
+        uid = len(_underlying_symbols)
+        _underlying_ids[symbol] = uid
+        _underlying_symbols.append(symbol)
+    return uid
+
+
+def underlying_symbol(uid: int):
+    """
+    :param uid: id from underlying_id
+    :return: the symbol
+    """
+    return _underlying_symbols[uid]
+
+
+def root_underlying(root: str):
+    """
+    :param root: OPRA root or symbol, e.g. SPXW
+    :return: the underlying symbol it trades on (SPX), as seen in the loaded chains; the root itself otherwise
+    """
+    return _root_underlyings.get(root, root)
+
+
+def contract_key(symbol: str, expiration: dt.datetime, strike, opt_type: str):
+    """
+    Integer equivalent of opra_code. As with OPRA, a stock is identified by its symbol alone.
+    :return: contract key
+    :rtype: int
+    :raises ValueError: the expiration is outside the days since key_epoch that fit in the key
+    """
+    key = underlying_id(symbol) << 45
+    typ = key_types[opt_type[0].upper()]
+    if typ:
+        days = (expiration - key_epoch).days
+        if not 0 <= days <= 0xffff:
+            raise ValueError("Expiration {} is outside the contract key range".format(expiration))
+        key |= days << 29 | typ << 27 | int(round(strike * 1000))
+    return key
+
+
+def contract_key_from_opra(oc: str):
+    """
+    :param oc: OPRA code of an option, or a stock symbol
+    :return: contract key
+    """
+    if oc.isalpha():
+        return contract_key(oc, None, 0.0, 'S')
+    symbol, expiration, strike, opt_type = decompose_opra(oc)
+    return contract_key(symbol, expiration, strike, opt_type)
+
+
+def opra_code_from_key(key: int):
+    """
+    Display form of a contract key.
+    :return: opra code
+    :rtype: str
+    """
+    symbol = _underlying_symbols[key >> 45]
+    typ = key_type_letters[(key >> 27) & 0x3]
+    expiration = key_epoch + dt.timedelta(days=(key >> 29) & 0xffff)
+    return opra_code(symbol, expiration, (key & 0x7ffffff) / 1000.0, typ)
+
+
+def contract_keys_from_frame(frame):
+    """
+    Vectorized contract_key over an option frame's OptionSymbol, Expiration, Type and Strike columns.
+    The key uses the root of the OptionSymbol, so contracts of roots sharing an underlying (SPX and SPXW, RUT and
+    RUTW) stay distinct. Rows whose OptionSymbol has no root use UnderlyingSymbol. Roots that differ from their
+    UnderlyingSymbol are recorded for root_underlying.
+    :return: int64 array of contract keys
+    :raises ValueError: an expiration is outside the contract key range
+    """
+    ucodes, underlyings = pd.factorize(frame['UnderlyingSymbol'])
+    underlyings = np.asarray(underlyings, dtype=object)
+    roots = underlyings[ucodes]
+    if 'OptionSymbol' in frame:
+        codes, option_symbols = pd.factorize(frame['OptionSymbol'])
+        parsed = pd.Series(np.asarray(option_symbols, dtype=object)).str.extract(r'^([A-Z]+)\d{6}[CP]')[0]
+        parsed = parsed.to_numpy(dtype=object)
+        has_root = codes >= 0
+        has_root[has_root] = pd.notna(parsed[codes[has_root]])
+        roots[has_root] = parsed[codes[has_root]]
+        # Record the roots that differ from their underlying, from the distinct (OptionSymbol, underlying) pairs.
+        pairs = np.unique(codes[has_root].astype(np.int64) * len(underlyings) + ucodes[has_root])
+        pair_roots, pair_underlyings = parsed[pairs // len(underlyings)], underlyings[pairs % len(underlyings)]
+        differ = pair_roots != pair_underlyings
+        _root_underlyings.update(zip(pair_roots[differ], pair_underlyings[differ]))
+    codes, symbols = pd.factorize(roots)
+    uids = np.array([underlying_id(s) for s in symbols], dtype=np.int64)[codes]
+    codes, types = pd.factorize(frame['Type'])
+    typs = np.array([key_types[str(t)[0].upper()] for t in types], dtype=np.int64)[codes]
+    days = (frame['Expiration'].values.astype('datetime64[D]') - np.datetime64(key_epoch, 'D')).astype(np.int64)
+    out_of_range = (days < 0) | (days > 0xffff)
+    if out_of_range.any():
+        raise ValueError("Expiration {} is outside the contract key range".format(
+            frame['Expiration'].iloc[int(np.argmax(out_of_range))]))
+    strikes = np.rint(frame['Strike'].to_numpy(dtype=np.float64) * 1000).astype(np.int64)
+    return uids << 45 | days << 29 | typs << 27 | strikes
+
+
 def decompose_opra(oc):
     """
     Parse oc like MS180601C00040000
@@ -48,6 +190,57 @@ def decompose_opra(oc):
     return symbol, expiration, strike, opt_type
 
 
+def opra_codes(symbols, expirations, strikes, opt_types):
+    """
+    Vectorized opra_code over whole columns. Each distinct contract is formatted once and the result is spread back
+    over the rows, so the cost follows the number of contracts rather than the number of rows.
+    :param symbols: array-like of underlying symbols
+    :param expirations: array-like of expiration dates
+    :param strikes: array-like of strike prices
+    :param opt_types: array-like of types (call/put/stock, only the first letter is used)
+    :return: object array of opra codes
+    """
+    frame = pd.DataFrame({'UnderlyingSymbol': np.asarray(symbols), 'Expiration': pd.to_datetime(expirations),
+                          'Strike': np.asarray(strikes, dtype=np.float64), 'Type': np.asarray(opt_types)})
+    codes, keys = pd.factorize(contract_keys_from_frame(frame))
+    text = np.array([opra_code_from_key(int(k)) for k in keys], dtype=object)
+    return text[codes]
+
+
+def opra_codes_from_frame(frame):
+    """
+    :param frame: option frame with UnderlyingSymbol, Expiration, Strike and Type columns
+    :return: object array of opra codes, one per row
+    """
+    return opra_codes(frame['UnderlyingSymbol'], frame['Expiration'], frame['Strike'], frame['Type'])
+
+
+def decompose_opra_codes(ocs):
+    """
+    Vectorized decompose_opra. Each distinct code is parsed once.
+    :param ocs: array-like of opra codes like MS180601C00040000
+    :return: symbols, expirations, strikes, option_types as arrays
+    """
+    codes, uniq = pd.factorize(np.asarray(ocs, dtype=object))
+    parts = pd.Series(uniq, dtype=object).str.extract(r'^([A-Z]+)([0-9]{6})([CP])([0-9]+)$')
+    if parts.isna().any().any():
+        raise ValueError("Not an option OPRA code: {}".format(uniq[parts[0].isna().to_numpy()][0]))
+    symbols = parts[0].to_numpy(dtype=object)[codes]
+    expirations = pd.to_datetime('20' + parts[1], format='%Y%m%d').to_numpy()[codes]
+    strikes = (parts[3].astype(np.int64).to_numpy() / 1000.0)[codes]
+    opt_types = parts[2].to_numpy(dtype=object)[codes]
+    return symbols, expirations, strikes, opt_types
+
+
+def mismatched_opra_codes(frame):
+    """
+    Validate each row's OptionSymbol against the code computed from its UnderlyingSymbol, Expiration, Strike and Type.
+    :param frame: option frame
+    :return: boolean array, True where OptionSymbol does not match
+    """
+    return np.asarray(frame['OptionSymbol'], dtype=object) != opra_codes_from_frame(frame)
+
+
 def _prob_itm(row):
     prob_itm = 0.0
     dte = float((row['Expiration'] - row['DataDate']).days) / 365.0
@@ -65,78 +258,87 @@ def _prob_itm(row):
     return prob_itm
 
 
-def _opra_code_from_df_row(row):
+def atm_iv(frame):
     """
-    returns the OPRA code for the option per https://www.schwabpt.com/public/file/P-9423758/spt011453.pdf
-    :param row: a Numpy
-    :return: opra code
-    :rtype: str
+    The IV of the at-the-money contract (strike nearest the underlying price, first one on a tie) of each DataDate
+    and Type, broadcast to every row of that DataDate and Type.
+    :param frame: option frame
+    :return: array of ATM IV aligned with frame
     """
-    symbol = row['UnderlyingSymbol']
-    expiration = row['Expiration']
-    strike = row['Strike']
-    opt_type = row['Type']
-    opra = "{}{}{}{}{}{:08d}".format(symbol.ljust(6, ' '),
-                                 expiration.year, expiration.month, expiration.day,
-                                 opt_type[0],
-                                 int(strike*1000))
-    return opra
+    distance = (frame['Strike'] - frame['UnderlyingPrice']).abs()
+    atm = distance.groupby([frame['DataDate'], frame['Type']], observed=True, sort=False).transform('idxmin')
+    return frame['IV'].loc[atm.to_numpy()].to_numpy()
+
+
+def add_studies(frame):
+    """
+    Add the study columns to an option frame, all column-wise:
+       ProbITM: chance of finishing in the money from the ATM IV of the contract's DataDate and Type (see _prob_itm)
+       OPRA: OPRA code of every contract
+    :param frame: option frame with a unique index
+    :return: the same frame
+    """
+    is_call = np.asarray(frame['Type'] == 'call')
+    frame['ProbITM'] = prob_itm(frame['UnderlyingPrice'].to_numpy(), frame['Strike'].to_numpy(),
+                                years_to_expiration(frame['Expiration'], frame['DataDate']), atm_iv(frame), is_call)
+    frame['OPRA'] = opra_codes_from_frame(frame)
+    return frame
+
+
+def write_csv_atomic(frame, fn):
+    """
+    Write a frame as CSV to a temporary file next to fn, then rename it into place, so an interrupted write never
+    leaves a truncated history behind.
+    """
+    tmp_fn = fn + '.{}.tmp'.format(os.getpid())
+    try:
+        with open(tmp_fn, mode='w', newline='\n') as fh:
+            frame.to_csv(fh, lineterminator='\n')
+        os.replace(tmp_fn, fn)
+    finally:
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
 
 
-def add_studies_histories():
+def add_studies_histories(symbols=('RUT',)):
     """
     One time function to run on all new data extracts.
     Adds a few additional columns to each:
-       Options: ProbITM
+       Options: ProbITM, OPRA
        Quotes: ADX
+    :param symbols: symbols of the option histories to update in place
     """
-    symbols = ['RUT']
-
     for symbol in symbols:
         fn = option_path + symbol + '.csv'
         print("Loading {}".format(fn))
         option_date_cols = ['Expiration', 'DataDate']
         frame = pd.read_csv(fn, parse_dates=option_date_cols)
 
-        # Let's store the atm_TYPE_iv for every expiration, type
-        # First, we compute distance of each to the current strike in abs terms
-        print("  Compute atm distance")
-        frame['ProbITM'] = frame.apply(lambda row: abs(row['Strike'] - row['UnderlyingPrice']), axis=1)
-
-        # Now we return the index of the row with the min for the group as a series indexed by DataDate and Type
-        print("  Compute min atm dist indices")
-        min_atm_idx = frame.groupby(['DataDate', 'Type'])['ProbITM'].idxmin()
-
-        # For every row in the frame, look up it's atm_iv index from the series and get the IV from that row.
-        print("  Store atm_iv")
-        frame['ProbITM'] = frame.apply(lambda row: frame['IV'].loc[min_atm_idx.loc[(row['DataDate'], row['Type'])]],
-                                       axis=1)
-
-        print("  Compute prob_iv")
-        frame['ProbITM'] = frame.apply(lambda row: _prob_itm(row), axis=1)
-
-        print("  Adding OPRA codes")
-        frame['OPRA'] = frame.apply(lambda row: _opra_code_from_df_row(row), axis=1)
+        print("  Adding ProbITM and OPRA codes")
+        add_studies(frame)
 
         # and save it back to disk
         print("  Save file")
-        with open(fn, mode='w', newline='\n') as fh:
-            frame.to_csv(fh, line_terminator='\n')
+        write_csv_atomic(frame, fn)
 
 
-def build_data_lakes():
-    symbols = ['MS']
-    for symbol in symbols:
-        fn = option_path + symbol + '.csv'
-        print("Loading {}".format(fn))
-        option_date_cols = ['Expiration', 'DataDate']
-        frame = pd.read_csv(fn, parse_dates=option_date_cols)
+def build_data_lakes(symbols=('MS',), root=None):
+    """
+    Write the option and quote histories of each symbol into the monthly partitioned data lake (see tyche.lake):
+        $ROOT/SYMBOL/YEAR/MM/SYMBOL_chains and SYMBOL_quotes
+    Load a date range back with tyche.lake.load_chain and load_quote.
+    :param symbols: symbols to write
+    :param root: lake directory, the option history directory if None
+    """
+    from tyche.chain import Chain
+    from tyche.quote import Quote
+    from tyche.lake import build_lake
 
-        # First, write the big file at $ROOT/SYMBOL/YEAR/SYMBOL_chains.csv
-        full_fn = option_path + symbol + "/" + symbol + "_chains.csv"
-        with open(full_fn, mode='w', newline='\n') as fh:
-            frame.to_csv(fh, line_terminator='\n')
+    root = root or option_path
+    for symbol in symbols:
+        print("Loading {}".format(symbol))
+        chain = Chain(symbol, option_path)
+        quote = Quote(symbol, quote_path)
 
-        # Next, split frame by month of the DataDate and write out as CSV in these files:
-        # $ROOT/SYMBOL/YEAR/MM/SYMBOL_chains.csv
-        # TODO: Subdivide and write the files in the new locations
+        print("  Writing partitions")
+        build_lake(chain, quote, root)